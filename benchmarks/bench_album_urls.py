@@ -0,0 +1,102 @@
+"""
+Throughput of the album url classification, per url versus in bulk.
+
+    python benchmarks/bench_album_urls.py [--count N] [--rounds N]
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from unsee_dl.unsee import (  # noqa: E402
+    ALBUM_HOSTS,
+    classify_album_url,
+    classify_album_urls,
+    is_old_album_id,
+)
+
+
+def get_album_id_urlparse(album_url):
+    # Previous get_album_id_from_url
+    url = urlparse(album_url)
+    if url.netloc in ALBUM_HOSTS:
+        return url.fragment
+    return None
+
+
+def route_urlparse(album_urls):
+    # Previous routing: extract every id, then filter the list once per pipeline
+    album_ids = [get_album_id_urlparse(album_url) for album_url in album_urls]
+    album_ids = [album_id for album_id in album_ids if album_id]
+    old = list(filter(lambda x: is_old_album_id(x), album_ids))
+    new = list(filter(lambda x: not is_old_album_id(x), album_ids))
+    return old, new
+
+
+def route_per_url(album_urls):
+    old, new = [], []
+    for album_url in album_urls:
+        _, album_id = classify_album_url(album_url)
+        if album_id:
+            (old if is_old_album_id(album_id) else new).append(album_id)
+    return old, new
+
+
+def route_bulk(album_urls):
+    album_urls = classify_album_urls(album_urls)
+    return album_urls.old, album_urls.new
+
+
+CASES = [
+    ("urlparse (previous)", route_urlparse),
+    ("classify per url", route_per_url),
+    ("classify bulk", route_bulk),
+]
+
+
+def make_urls(count):
+    rng = random.Random(0)
+    alphabet = string.ascii_letters + string.digits
+    templates = [
+        "https://unsee.cc/#{}",
+        "https://beta-app.unsee.cc/#{}",
+        "https://old.unsee.cc/#{}",
+        "#{}",
+        "{}",
+    ]
+    urls = []
+    for _ in range(count):
+        album_id = "".join(rng.choice(alphabet) for _ in range(rng.choice((8, 16))))
+        urls.append(rng.choice(templates).format(album_id))
+    return urls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=1000000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    urls = make_urls(args.count)
+    print("{:<24} {:>12} {:>10}".format("method", "urls/s", "routed"))
+    for name, route in CASES:
+        best = None
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            old, new = route(urls)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print(
+            "{:<24} {:>12.0f} {:>10d}".format(
+                name, args.count / best, len(old) + len(new)
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Throughput of the image read strategies, downloading from a local server.
+
+    python benchmarks/bench_read_strategy.py [--size BYTES] [--rounds N]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from unsee_dl.chunks import (  # noqa: E402
+    DEFAULT_CHUNK_SIZE,
+    READ_ANY,
+    READ_AUTO,
+    READ_FIXED,
+    iter_chunks,
+)
+
+CASES = [
+    ("fixed 1 KiB (previous)", READ_FIXED, 1024),
+    ("fixed 64 KiB", READ_FIXED, DEFAULT_CHUNK_SIZE),
+    ("fixed 1 MiB", READ_FIXED, 1024 * 1024),
+    ("any", READ_ANY, DEFAULT_CHUNK_SIZE),
+    ("auto", READ_AUTO, DEFAULT_CHUNK_SIZE),
+]
+
+
+async def run(size, rounds):
+    body = os.urandom(size)
+
+    async def image(request):
+        return web.Response(body=body, content_type="image/jpeg")
+
+    app = web.Application()
+    app.router.add_get("/image", image)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    url = "http://127.0.0.1:{}/image".format(port)
+
+    try:
+        async with aiohttp.ClientSession() as session:
+            print("{:<24} {:>10} {:>10}".format("strategy", "MB/s", "reads"))
+            for name, strategy, chunk_size in CASES:
+                reads = 0
+                start = time.perf_counter()
+                for _ in range(rounds):
+                    async with session.get(url) as response:
+                        async for chunk in iter_chunks(
+                            response.content,
+                            strategy,
+                            chunk_size,
+                            response.content_length,
+                        ):
+                            reads += 1
+                elapsed = time.perf_counter() - start
+                print(
+                    "{:<24} {:>10.1f} {:>10d}".format(
+                        name, size * rounds / elapsed / 1e6, reads // rounds
+                    )
+                )
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=5 * 1024 * 1024)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    asyncio.get_event_loop().run_until_complete(run(args.size, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,51 +1,243 @@
 import argparse
 import asyncio
 import logging
+import multiprocessing
+import queue
 import sys
-from typing import List
+import threading
+from typing import AsyncIterable, Iterable, List, TextIO, Union
 
 from unsee_dl import __version__ as unsee_dl_version
+from unsee_dl.chunks import DEFAULT_CHUNK_SIZE, READ_AUTO, READ_STRATEGIES
+from unsee_dl.filesink import DEFAULT_IO_WORKERS, DEFAULT_WRITE_BATCH_SIZE, FileSink
+from unsee_dl.jobqueue import (
+    DEFAULT_LEASE,
+    DEFAULT_MAX_ATTEMPTS,
+    JobQueue,
+    Worker,
+    get_worker_id,
+)
+from unsee_dl.listing_cache import DEFAULT_MAX_AGE
+from unsee_dl.manifest import Manifest
+from unsee_dl.ratelimit import RateLimiter
+from unsee_dl.retry import (
+    DEFAULT_BASE_DELAY,
+    DEFAULT_FAILURE_THRESHOLD,
+    DEFAULT_IMAGE_RETRIES,
+    DEFAULT_MAX_DELAY,
+    DEFAULT_RESET_TIMEOUT,
+    DEFAULT_RETRIES,
+    Retrier,
+    RetryPolicy,
+)
+from unsee_dl.scheduler import (
+    DownloadResult,
+    chunked_async,
+    run_bounded,
+    split_stream,
+)
+from unsee_dl.server import (
+    DEFAULT_HOST,
+    DEFAULT_MAX_JOBS,
+    DEFAULT_PORT,
+    DownloadServer,
+)
+from unsee_dl.session import (
+    DEFAULT_CONNECTIONS,
+    DEFAULT_DNS_CACHE_TTL,
+    DEFAULT_KEEPALIVE_TIMEOUT,
+    create_session,
+)
 from unsee_dl.unsee import get_album_id_from_url, is_old_album_id
-from unsee_dl.unsee_new import Client as ClientNew
-from unsee_dl.unsee_old import ClientOld
+from unsee_dl.unsee_new import METADATA_GROUPS, Client as ClientNew
+from unsee_dl.unsee_old import DEFAULT_RECEIVE_TIMEOUT, ClientOld
 
 
 def main():
-    asyncio.get_event_loop().run_until_complete(run_downloader())
+    command = _COMMANDS.get(sys.argv[1]) if len(sys.argv) > 1 else None
+    result = asyncio.get_event_loop().run_until_complete(
+        command() if command else run_downloader()
+    )
+    if result is not None and result.failed:
+        sys.exit(1)
 
 
-async def download_old(album_ids: List[str], out_dir: str, group_album: bool):
-    async with ClientOld(out_path=out_dir, group_album=group_album) as client:
-        for album_id in album_ids:
-            # noinspection PyBroadException
-            try:
-                print("Downloading album {:s}...".format(album_id))
-                await client.download_album(album_id)
-                logging.info("Download completed for album {}.".format(album_id))
-            except Exception as ex:
-                logging.error(
-                    "Failed downloading album {}.".format(album_id), exc_info=ex
-                )
+AlbumIds = Union[Iterable[str], AsyncIterable[str]]
 
+# Lines read ahead of the downloads from an input file
+_INPUT_QUEUE_SIZE = 64 * 1024
 
-async def download_new(album_ids: List[str], out_dir: str, group_album: bool):
-    async with ClientNew(out_path=out_dir, group_album=group_album) as client:
 
-        for album_id in album_ids:
-            # noinspection PyBroadException
+async def read_lines(file: TextIO):
+    """
+    Read the lines of a file in a thread, so that waiting for a slow producer on
+    stdin doesn't block the downloads. Each line is yielded as soon as it is read.
+    """
+    lines = queue.Queue(_INPUT_QUEUE_SIZE)
+
+    def read():
+        # noinspection PyBroadException
+        try:
+            for line in file:
+                lines.put(line)
+        except Exception as ex:
+            lines.put(ex)
+        lines.put(None)
+
+    # A daemon thread, the producer may never close stdin
+    threading.Thread(target=read, name="read-lines", daemon=True).start()
+
+    loop = asyncio.get_event_loop()
+    while True:
+        try:
+            # Timeout so that the executor thread isn't held once the download stops
+            line = await loop.run_in_executor(None, lines.get, True, 1)
+        except queue.Empty:
+            continue
+
+        # Then the lines already read, without a round trip to the executor each
+        while line is not None:
+            if isinstance(line, Exception):
+                raise line
+            yield line
             try:
-                print("Downloading album {:s}...".format(album_id))
-                await client.anonymous_login(album_id)
+                line = lines.get_nowait()
+            except queue.Empty:
+                break
+        else:
+            return
+
+
+async def read_album_ids(urls: List[str], inputs: List[TextIO]):
+    """
+    Read album ids from the command line urls then the input files, lazily and skipping
+    invalid urls and repeated ids. A "-" url reads the urls from stdin.
+    """
+    seen = set()
+
+    async def read_urls():
+        for url in urls:
+            if url == "-":
+                async for line in read_lines(sys.stdin):
+                    yield line
+            else:
+                yield url
+        for file in inputs:
+            async for line in read_lines(file):
+                yield line
+
+    async for url in read_urls():
+        url = url.strip()
+        if not url:
+            continue
+
+        album_id = get_album_id_from_url(url)
+        if not album_id:
+            logging.warning("Skipping invalid album url {}".format(url))
+        elif album_id not in seen:
+            seen.add(album_id)
+            yield album_id
+
+
+async def download_old(
+    client: ClientOld,
+    album_ids: AlbumIds,
+    album_concurrency: int = 1,
+    dry_run: bool = False,
+    result: DownloadResult = None,
+) -> DownloadResult:
+    if result is None:
+        result = DownloadResult()
+
+    async def download(album_id):
+        # noinspection PyBroadException
+        try:
+            print("Downloading album {:s}...".format(album_id))
+            await client.download_album(album_id, dry_run)
+            logging.info("Download completed for album {}.".format(album_id))
+            result.add_completed(album_id)
+        except Exception as ex:
+            logging.error("Failed downloading album {}.".format(album_id), exc_info=ex)
+            result.add_failed(album_id, "{}: {}".format(type(ex).__name__, ex))
+
+    await run_bounded(album_ids, download, album_concurrency)
+    return result
+
+
+async def download_new(
+    client: ClientNew,
+    album_ids: AlbumIds,
+    album_concurrency: int = 1,
+    dry_run: bool = False,
+    result: DownloadResult = None,
+) -> DownloadResult:
+    if result is None:
+        result = DownloadResult()
+
+    async def download(album_id):
+        # noinspection PyBroadException
+        try:
+            print("Downloading album {:s}...".format(album_id))
+            if dry_run:
+                await client.list_album_images(album_id)
+            else:
                 await client.download_album(album_id)
-                logging.info("Download completed for album {}.".format(album_id))
-            except Exception as ex:
-                logging.error(
-                    "Failed downloading album {}.".format(album_id), exc_info=ex
-                )
+            logging.info("Download completed for album {}.".format(album_id))
+            result.add_completed(album_id)
+        except Exception as ex:
+            logging.error("Failed downloading album {}.".format(album_id), exc_info=ex)
+            result.add_failed(album_id, "{}: {}".format(type(ex).__name__, ex))
 
+    await run_bounded(album_ids, download, album_concurrency)
+    return result
 
-async def run_downloader():
-    parser = argparse.ArgumentParser(description="unsee.cc downloader")
+
+async def download_albums(
+    client_old: ClientOld,
+    client_new: ClientNew,
+    album_ids: AlbumIds,
+    album_concurrency: int = 1,
+    dry_run: bool = False,
+    result: DownloadResult = None,
+) -> DownloadResult:
+    """
+    Download albums of both protocols, running the old and new pipelines at the same time.
+    The album ids are routed to the pipelines as they are read.
+    """
+    if result is None:
+        result = DownloadResult()
+    routing, album_ids_old_version, album_ids_new_version = split_stream(
+        album_ids, is_old_album_id, album_concurrency
+    )
+
+    try:
+        await asyncio.gather(
+            download_old(
+                client_old, album_ids_old_version, album_concurrency, dry_run, result
+            ),
+            download_new(
+                client_new, album_ids_new_version, album_concurrency, dry_run, result
+            ),
+        )
+        await routing
+    finally:
+        # Stops reading the album ids when the download is cancelled
+        routing.cancel()
+
+    return result
+
+
+def parse_metadata_groups(value: str) -> List[str]:
+    groups = [group for group in value.split(",") if group]
+    for group in groups:
+        if group not in METADATA_GROUPS:
+            raise argparse.ArgumentTypeError(
+                "unknown metadata group {}".format(group)
+            )
+    return groups
+
+
+def add_download_arguments(parser: argparse.ArgumentParser):
     parser.add_argument(
         "--version",
         action="version",
@@ -80,23 +272,733 @@ async def run_downloader():
         help="Group each album in its own directory",
     )
     parser.add_argument(
-        "album_ids", action="store", nargs="+", help="unsee.cc album IDs to download"
+        "--shard",
+        action="store_const",
+        dest="shard",
+        default=False,
+        const=True,
+        help="Spread images in two levels of directories named after the hash of "
+        "their file name, for very large outputs",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_const",
+        dest="incremental",
+        default=False,
+        const=True,
+        help="Download only the images new or changed since the last run",
+    )
+    parser.add_argument(
+        "--dedupe",
+        action="store_const",
+        dest="dedupe",
+        default=False,
+        const=True,
+        help="Link images already downloaded for other albums instead of "
+        "downloading them again",
+    )
+    parser.add_argument(
+        "-n",
+        "--dry-run",
+        action="store_const",
+        dest="dry_run",
+        default=False,
+        const=True,
+        help="List the albums without downloading them",
+    )
+    parser.add_argument(
+        "--listing-cache",
+        action="store",
+        dest="listing_cache",
+        type=str,
+        default=None,
+        help="SQLite database caching album listings between runs",
+    )
+    parser.add_argument(
+        "--listing-max-age",
+        action="store",
+        dest="listing_max_age",
+        type=float,
+        default=DEFAULT_MAX_AGE,
+        help="Seconds a cached album listing is used",
+    )
+    parser.add_argument(
+        "--album-concurrency",
+        action="store",
+        dest="album_concurrency",
+        type=int,
+        default=1,
+        help="Number of albums downloaded at the same time",
+    )
+    parser.add_argument(
+        "--image-concurrency",
+        action="store",
+        dest="image_concurrency",
+        type=int,
+        default=1,
+        help="Number of images of an album downloaded at the same time",
+    )
+    parser.add_argument(
+        "--write-concurrency",
+        action="store",
+        dest="write_concurrency",
+        type=int,
+        default=1,
+        help="Number of images of an album written to disk at the same time",
+    )
+    parser.add_argument(
+        "--queue-size",
+        action="store",
+        dest="queue_size",
+        type=int,
+        default=16,
+        help="Maximum number of items waiting between download stages",
+    )
+    parser.add_argument(
+        "--read-strategy",
+        action="store",
+        dest="read_strategy",
+        choices=READ_STRATEGIES,
+        default=READ_AUTO,
+        help="How image downloads are read: fixed size chunks, whatever is "
+        "buffered, or chunks sized on the image length",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        action="store",
+        dest="chunk_size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help="Size in bytes of each read of the fixed read strategy",
+    )
+    parser.add_argument(
+        "--io-workers",
+        action="store",
+        dest="io_workers",
+        type=int,
+        default=DEFAULT_IO_WORKERS,
+        help="Number of threads writing files",
+    )
+    parser.add_argument(
+        "--write-batch-size",
+        action="store",
+        dest="write_batch_size",
+        type=int,
+        default=DEFAULT_WRITE_BATCH_SIZE,
+        help="Bytes buffered for each file before being written",
+    )
+    parser.add_argument(
+        "--connections",
+        action="store",
+        dest="connections",
+        type=int,
+        default=DEFAULT_CONNECTIONS,
+        help="Maximum number of connections (0 for no limit)",
+    )
+    parser.add_argument(
+        "--connections-per-host",
+        action="store",
+        dest="connections_per_host",
+        type=int,
+        default=0,
+        help="Maximum number of connections per host (0 for no limit)",
+    )
+    parser.add_argument(
+        "--keepalive-timeout",
+        action="store",
+        dest="keepalive_timeout",
+        type=float,
+        default=DEFAULT_KEEPALIVE_TIMEOUT,
+        help="Seconds an idle connection is kept open for reuse",
+    )
+    parser.add_argument(
+        "--dns-cache-ttl",
+        action="store",
+        dest="dns_cache_ttl",
+        type=float,
+        default=DEFAULT_DNS_CACHE_TTL,
+        help="Seconds DNS resolutions are cached",
+    )
+    parser.add_argument(
+        "--receive-timeout",
+        action="store",
+        dest="receive_timeout",
+        type=float,
+        default=DEFAULT_RECEIVE_TIMEOUT,
+        help="Seconds waiting for the next image of an old unsee album before giving up "
+        "on the images left",
+    )
+    parser.add_argument(
+        "--max-request-rate",
+        action="store",
+        dest="max_request_rate",
+        type=float,
+        default=0,
+        help="Maximum requests per second (0 for no limit)",
+    )
+    parser.add_argument(
+        "--max-download-rate",
+        action="store",
+        dest="max_download_rate",
+        type=float,
+        default=0,
+        help="Maximum bytes downloaded per second (0 for no limit)",
+    )
+    parser.add_argument(
+        "--retries",
+        action="store",
+        dest="retries",
+        type=int,
+        default=DEFAULT_RETRIES,
+        help="Attempts of the login and album listing requests",
+    )
+    parser.add_argument(
+        "--image-retries",
+        action="store",
+        dest="image_retries",
+        type=int,
+        default=DEFAULT_IMAGE_RETRIES,
+        help="Attempts of each image download",
+    )
+    parser.add_argument(
+        "--retry-backoff",
+        action="store",
+        dest="retry_backoff",
+        type=float,
+        default=DEFAULT_BASE_DELAY,
+        help="Seconds before the first retry, doubled on each retry",
+    )
+    parser.add_argument(
+        "--retry-max-delay",
+        action="store",
+        dest="retry_max_delay",
+        type=float,
+        default=DEFAULT_MAX_DELAY,
+        help="Maximum seconds between two attempts",
+    )
+    parser.add_argument(
+        "--breaker-threshold",
+        action="store",
+        dest="breaker_threshold",
+        type=int,
+        default=DEFAULT_FAILURE_THRESHOLD,
+        help="Consecutive failures pausing the requests to a host (0 to disable)",
+    )
+    parser.add_argument(
+        "--breaker-reset",
+        action="store",
+        dest="breaker_reset",
+        type=float,
+        default=DEFAULT_RESET_TIMEOUT,
+        help="Seconds the requests to a failing host are paused",
+    )
+    parser.add_argument(
+        "--token-cache",
+        action="store",
+        dest="token_cache",
+        type=str,
+        default=None,
+        help="File caching anonymous tokens between runs",
+    )
+    parser.add_argument(
+        "--metadata",
+        action="store",
+        dest="metadata_groups",
+        type=parse_metadata_groups,
+        default=[],
+        help="Comma separated album metadata to request: {}".format(
+            ",".join(METADATA_GROUPS)
+        ),
+    )
+    parser.add_argument(
+        "--save-metadata",
+        action="store_const",
+        dest="save_metadata",
+        default=False,
+        const=True,
+        help="Save the requested album metadata to a json file",
+    )
+
+
+class Downloader:
+    def __init__(self, args: argparse.Namespace):
+        """
+        Clients of both protocols sharing a connection pool, a file sink, retries and rate
+        limits, configured from the command line arguments
+        """
+        self.args = args
+        self.sink = FileSink(args.io_workers, args.write_batch_size)
+        limiter = RateLimiter(args.max_request_rate, args.max_download_rate)
+        retrier = Retrier(
+            {
+                "default": RetryPolicy(
+                    args.retries, args.retry_backoff, args.retry_max_delay
+                ),
+                "image": RetryPolicy(
+                    args.image_retries, args.retry_backoff, args.retry_max_delay
+                ),
+            },
+            args.breaker_threshold,
+            args.breaker_reset,
+        )
+        self.session = create_session(
+            args.connections,
+            args.connections_per_host,
+            args.keepalive_timeout,
+            args.dns_cache_ttl,
+        )
+        self.client_old = ClientOld(
+            session=self.session,
+            out_path=args.out_dir,
+            group_album=args.group_album,
+            sink=self.sink,
+            max_pending_images=args.queue_size,
+            receive_timeout=args.receive_timeout,
+            shard=args.shard,
+            limiter=limiter,
+        )
+        self.client_new = ClientNew(
+            session=self.session,
+            out_path=args.out_dir,
+            group_album=args.group_album,
+            image_concurrency=args.image_concurrency,
+            write_concurrency=args.write_concurrency,
+            queue_size=args.queue_size,
+            read_strategy=args.read_strategy,
+            chunk_size=args.chunk_size,
+            token_cache=args.token_cache,
+            metadata_groups=args.metadata_groups,
+            save_metadata=args.save_metadata,
+            sink=self.sink,
+            incremental=args.incremental,
+            dedupe=args.dedupe,
+            listing_cache=args.listing_cache,
+            listing_max_age=args.listing_max_age,
+            shard=args.shard,
+            retrier=retrier,
+            limiter=limiter,
+        )
+
+    async def __aenter__(self):
+        await self.client_old.__aenter__()
+        await self.client_new.__aenter__()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.client_new.__aexit__(exc_type, exc_val, exc_tb)
+        await self.client_old.__aexit__(exc_type, exc_val, exc_tb)
+        await self.session.close()
+        self.sink.close()
+
+    async def download(
+        self, album_ids: AlbumIds, dry_run: bool = None, result: DownloadResult = None
+    ) -> DownloadResult:
+        return await download_albums(
+            self.client_old,
+            self.client_new,
+            album_ids,
+            self.args.album_concurrency,
+            self.args.dry_run if dry_run is None else dry_run,
+            result,
+        )
+
+
+def add_album_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--input",
+        action="append",
+        dest="inputs",
+        type=argparse.FileType("r"),
+        default=[],
+        help="File listing unsee.cc album urls or IDs to download, one per line "
+        "(- for stdin)",
+    )
+    parser.add_argument(
+        "album_ids",
+        action="store",
+        nargs="*",
+        help="unsee.cc album urls or IDs to download (- to read them from stdin)",
     )
-    args = parser.parse_args(sys.argv[1:])
+
+
+def parse_album_arguments(parser: argparse.ArgumentParser, argv: List[str]):
+    args = parser.parse_args(argv)
+    if not args.album_ids and not args.inputs:
+        parser.error("no album to download, give album IDs or an --input file")
+    return args
+
+
+def close_inputs(args: argparse.Namespace):
+    for file in args.inputs:
+        if file is not sys.stdin:
+            file.close()
+
+
+# Messages sent by the download processes, with their index and an album id
+_TAKEN = "taken"
+_COMPLETED = "completed"
+_FAILED = "failed"
+
+
+def run_download_process(
+    index: int,
+    args: argparse.Namespace,
+    album_queue: multiprocessing.Queue,
+    result_queue: multiprocessing.Queue,
+):
+    """
+    Download the albums of a queue shared with other processes, until a None album id
+    """
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    async def take_album_ids():
+        while True:
+            album_id = await loop.run_in_executor(None, album_queue.get)
+            if album_id is None:
+                return
+            result_queue.put((index, _TAKEN, album_id))
+            yield album_id
+
+    def on_done(album_id, completed, error):
+        result_queue.put((index, _COMPLETED if completed else _FAILED, album_id))
+
+    async def download():
+        async with Downloader(args) as downloader:
+            await downloader.download(
+                take_album_ids(), result=DownloadResult(on_done=on_done)
+            )
+
+    try:
+        loop.run_until_complete(download())
+    finally:
+        loop.close()
+
+
+async def download_in_processes(
+    args: argparse.Namespace, album_ids: AlbumIds
+) -> DownloadResult:
+    """
+    Download albums with a pool of processes, each one running its own event loop and
+    connections. The albums are handed out through a bounded queue as they are read.
+    """
+    count = args.processes
+    process_args = argparse.Namespace(**vars(args))
+    process_args.album_ids = []
+    process_args.inputs = []
+    # The limits apply to the whole download
+    process_args.max_request_rate = args.max_request_rate / count
+    process_args.max_download_rate = args.max_download_rate / count
+    if args.connections > 0:
+        process_args.connections = max(1, args.connections // count)
+
+    if args.incremental:
+        # Compacts the manifest before the processes start appending to it
+        Manifest(args.out_dir).load()
+
+    context = multiprocessing.get_context("spawn")
+    album_queue = context.Queue(maxsize=count * max(1, args.album_concurrency))
+    result_queue = context.Queue()
+    processes = [
+        context.Process(
+            target=run_download_process,
+            args=(index, process_args, album_queue, result_queue),
+            daemon=True,
+        )
+        for index in range(count)
+    ]
+    for process in processes:
+        process.start()
+
+    loop = asyncio.get_event_loop()
+    result = DownloadResult()
+    # Albums taken by each process and not done yet
+    taken = [set() for _ in processes]
+
+    def put(album_id):
+        while True:
+            try:
+                album_queue.put(album_id, timeout=1)
+                return True
+            except queue.Full:
+                if not any(process.is_alive() for process in processes):
+                    return False
+
+    def handle(message):
+        index, kind, album_id = message
+        if kind == _TAKEN:
+            taken[index].add(album_id)
+        else:
+            taken[index].discard(album_id)
+            if kind == _COMPLETED:
+                result.add_completed(album_id)
+            else:
+                result.add_failed(album_id)
+
+    def collect():
+        while True:
+            try:
+                handle(result_queue.get(timeout=1))
+            except queue.Empty:
+                if not any(process.is_alive() for process in processes):
+                    return
+
+    collector = loop.run_in_executor(None, collect)
+    stopped = False
+    async for album_id in album_ids:
+        if stopped or not await loop.run_in_executor(None, put, album_id):
+            stopped = True
+            result.add_failed(album_id)
+    if stopped:
+        logging.error("Download processes stopped before the end of the albums.")
+    else:
+        for _ in processes:
+            await loop.run_in_executor(None, put, None)
+
+    for process in processes:
+        await loop.run_in_executor(None, process.join)
+    await collector
+    # Results sent right before the processes exited
+    while True:
+        try:
+            handle(result_queue.get_nowait())
+        except queue.Empty:
+            break
+    # Albums no process took before stopping
+    while True:
+        try:
+            album_id = album_queue.get_nowait()
+        except queue.Empty:
+            break
+        if album_id is not None:
+            result.add_failed(album_id)
+
+    for index, process in enumerate(processes):
+        if process.exitcode != 0:
+            logging.error(
+                "Download process {} exited with code {}.".format(
+                    index, process.exitcode
+                )
+            )
+        for album_id in taken[index]:
+            result.add_failed(album_id)
+    return result
+
+
+async def run_downloader():
+    parser = argparse.ArgumentParser(description="unsee.cc downloader")
+    add_download_arguments(parser)
+    parser.add_argument(
+        "--processes",
+        action="store",
+        dest="processes",
+        type=int,
+        default=1,
+        help="Number of processes downloading albums, each with its own connections. "
+        "The rate limits and the connection limit are split between them.",
+    )
+    add_album_arguments(parser)
+    args = parse_album_arguments(parser, sys.argv[1:])
 
     logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING)
 
     # Download images
-    album_ids = [get_album_id_from_url(url) for url in args.album_ids]
-    album_ids_old_version = list(filter(lambda x: is_old_album_id(x), album_ids))
-    album_ids_new_version = list(filter(lambda x: not is_old_album_id(x), album_ids))
+    album_ids = read_album_ids(args.album_ids, args.inputs)
+    if args.processes > 1:
+        result = await download_in_processes(args, album_ids)
+    else:
+        async with Downloader(args) as downloader:
+            result = await downloader.download(album_ids)
+    close_inputs(args)
+
+    print(
+        "{} {} albums, {} failed.".format(
+            "Listed" if args.dry_run else "Downloaded",
+            len(result.completed),
+            len(result.failed),
+        )
+    )
+    return result
+
 
-    if len(album_ids_old_version) > 0:
-        await download_old(album_ids_old_version, args.out_dir, args.group_album)
+async def run_server():
+    parser = argparse.ArgumentParser(
+        prog="unsee-dl serve", description="unsee.cc download server"
+    )
+    add_download_arguments(parser)
+    parser.add_argument(
+        "--host",
+        action="store",
+        dest="host",
+        type=str,
+        default=DEFAULT_HOST,
+        help="Address to listen on",
+    )
+    parser.add_argument(
+        "--port",
+        action="store",
+        dest="port",
+        type=int,
+        default=DEFAULT_PORT,
+        help="Port to listen on",
+    )
+    parser.add_argument(
+        "--socket",
+        action="store",
+        dest="socket_path",
+        type=str,
+        default=None,
+        help="Unix socket to listen on instead of the host and port",
+    )
+    parser.add_argument(
+        "--max-jobs",
+        action="store",
+        dest="max_jobs",
+        type=int,
+        default=DEFAULT_MAX_JOBS,
+        help="Number of jobs run at the same time",
+    )
+    args = parser.parse_args(sys.argv[2:])
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING)
+
+    async with Downloader(args) as downloader:
+        server = DownloadServer(downloader.download, args.max_jobs)
+        await server.serve(args.host, args.port, args.socket_path)
+
+
+# Enqueued album ids written at once
+_ENQUEUE_BATCH_SIZE = 1000
+
+
+async def run_enqueue():
+    parser = argparse.ArgumentParser(
+        prog="unsee-dl enqueue", description="Queue albums for the unsee-dl workers"
+    )
+    parser.add_argument(
+        "database", action="store", help="Job database shared by the workers"
+    )
+    add_album_arguments(parser)
+    args = parse_album_arguments(parser, sys.argv[2:])
+
+    loop = asyncio.get_event_loop()
+    queue = JobQueue(args.database)
+    queue.open()
+    added = 0
+    total = 0
+    try:
+        async for album_ids in chunked_async(
+            read_album_ids(args.album_ids, args.inputs), _ENQUEUE_BATCH_SIZE
+        ):
+            added += await loop.run_in_executor(None, queue.enqueue, album_ids)
+            total += len(album_ids)
+    finally:
+        queue.close()
+        close_inputs(args)
+
+    print("Queued {} albums, {} already queued.".format(added, total - added))
+
+
+async def run_worker():
+    parser = argparse.ArgumentParser(
+        prog="unsee-dl worker",
+        description="Download the albums queued in a job database, alongside other "
+        "workers",
+    )
+    add_download_arguments(parser)
+    parser.add_argument(
+        "--lease",
+        action="store",
+        dest="lease",
+        type=float,
+        default=DEFAULT_LEASE,
+        help="Seconds a claimed album is reserved to a worker that stopped sending "
+        "heartbeats",
+    )
+    parser.add_argument(
+        "--heartbeat",
+        action="store",
+        dest="heartbeat",
+        type=float,
+        default=None,
+        help="Seconds between two heartbeats, defaults to a third of the lease",
+    )
+    parser.add_argument(
+        "--max-attempts",
+        action="store",
+        dest="max_attempts",
+        type=int,
+        default=DEFAULT_MAX_ATTEMPTS,
+        help="Attempts of an album before it is marked failed",
+    )
+    parser.add_argument(
+        "--claim-size",
+        action="store",
+        dest="claim_size",
+        type=int,
+        default=0,
+        help="Number of albums claimed at once, defaults to the album concurrency",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        action="store",
+        dest="poll_interval",
+        type=float,
+        default=5,
+        help="Seconds between two claims while other workers hold the remaining albums",
+    )
+    parser.add_argument(
+        "database", action="store", help="Job database shared by the workers"
+    )
+    args = parser.parse_args(sys.argv[2:])
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING)
+
+    queue = JobQueue(args.database, args.lease, args.max_attempts)
+    worker = Worker(
+        queue,
+        get_worker_id(),
+        args.claim_size or args.album_concurrency,
+        args.poll_interval,
+    )
+    heartbeat_interval = args.heartbeat or args.lease / 3
+
+    async def send_heartbeats():
+        while True:
+            await asyncio.sleep(heartbeat_interval)
+            # noinspection PyBroadException
+            try:
+                await worker.heartbeat()
+            except Exception as ex:
+                logging.warning("Failed sending heartbeat.", exc_info=ex)
+
+    await worker.run(queue.open)
+    print("Worker {} started.".format(worker.worker_id))
+    heartbeats = asyncio.ensure_future(send_heartbeats())
+    try:
+        async with Downloader(args) as downloader:
+            result = await downloader.download(
+                worker.album_ids(), result=DownloadResult(on_done=worker.release)
+            )
+        await worker.wait_released()
+    finally:
+        heartbeats.cancel()
+        await worker.run(queue.close)
+
+    print(
+        "Downloaded {} albums, {} failed.".format(
+            len(result.completed), len(result.failed)
+        )
+    )
+    return result
 
-    if len(album_ids_new_version) > 0:
-        await download_new(album_ids_new_version, args.out_dir, args.group_album)
 
+_COMMANDS = {
+    "serve": run_server,
+    "enqueue": run_enqueue,
+    "worker": run_worker,
+}
 
 if __name__ == "__main__":
     try:
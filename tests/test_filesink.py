@@ -0,0 +1,27 @@
+import asyncio
+import shutil
+
+from unsee_dl.filesink import FileSink
+
+
+def test_file_sink_recreates_removed_directories(tmp_path):
+    sink = FileSink()
+    album_path = tmp_path / "out" / "album"
+
+    async def run():
+        await sink.write_bytes(album_path / "first.jpg", b"first")
+        shutil.rmtree(str(tmp_path / "out"))
+        await sink.write_bytes(album_path / "second.jpg", b"second")
+        assert (album_path / "second.jpg").read_bytes() == b"second"
+
+        shutil.rmtree(str(tmp_path / "out"))
+        file = await sink.open(album_path / "third.jpg.part")
+        await file.write(b"third")
+        await file.close()
+
+    try:
+        asyncio.new_event_loop().run_until_complete(run())
+    finally:
+        sink.close()
+
+    assert (album_path / "third.jpg.part").read_bytes() == b"third"
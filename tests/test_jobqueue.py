@@ -0,0 +1,69 @@
+import asyncio
+import sqlite3
+import time
+
+from unsee_dl.jobqueue import JobQueue, Worker
+
+
+def test_job_queue_leases(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"), lease=0.1, max_attempts=2)
+    queue.open()
+
+    assert queue.enqueue(["a", "b"]) == 2
+    assert queue.enqueue(["b", "c"]) == 1
+
+    assert queue.claim("dead", 2) == ["a", "b"]
+    assert queue.claim("worker", 2) == ["c"]
+    assert not queue.is_drained("worker")
+
+    # The dead worker's albums are claimed again once their lease expires
+    time.sleep(0.2)
+    assert queue.heartbeat("worker") == 1
+    assert queue.claim("worker", 2) == ["a", "b"]
+    assert not queue.complete("dead", "a")
+    assert queue.complete("worker", "a")
+
+    # Failed albums are released until max_attempts
+    assert queue.fail("worker", "c", "error")
+    assert queue.claim("worker", 2) == ["c"]
+    assert queue.fail("worker", "c", "error")
+    assert queue.fail("worker", "b", "error")
+    assert queue.is_drained("worker")
+    assert queue.get_counts() == {"completed": 1, "failed": 2}
+
+    queue.close()
+
+
+def test_worker_claims_failed_albums_again(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"), max_attempts=3)
+    queue.open()
+    queue.enqueue(["a"])
+    worker = Worker(queue, "worker", poll_interval=0.01)
+    claims = []
+
+    async def download_failing():
+        async for album_id in worker.album_ids():
+            claims.append(album_id)
+            # Released after the claim loop asked for more albums
+            asyncio.get_event_loop().call_later(
+                0.05, worker.release, album_id, False, "ValueError: not found"
+            )
+        await worker.wait_released()
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(asyncio.wait_for(download_failing(), 5))
+    finally:
+        loop.close()
+        asyncio.set_event_loop(None)
+
+    assert claims == ["a", "a", "a"]
+    assert queue.get_counts() == {"failed": 1}
+    queue.close()
+
+    connection = sqlite3.connect(str(tmp_path / "jobs.db"))
+    assert connection.execute("SELECT error FROM jobs").fetchone() == (
+        "ValueError: not found",
+    )
+    connection.close()
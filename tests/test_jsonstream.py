@@ -0,0 +1,31 @@
+import json
+
+import pytest
+
+from unsee_dl.jsonstream import JsonStreamParser
+
+
+def test_json_stream_parser():
+    images = [{"id": "image{}".format(i), "urlBig": 'a\\"]}'} for i in range(3)]
+    document = json.dumps(
+        {"data": {"getAlbum": {"images": images, "chat": {"ttlLeft": 10}}}}
+    ).encode()
+
+    parser = JsonStreamParser(
+        ("data", "getAlbum", "images"), [("errors",), ("data", "getAlbum", "chat")]
+    )
+    events = []
+    for i in range(len(document)):
+        events += parser.feed(document[i : i + 1])
+    events += parser.close()
+
+    assert events == [(("data", "getAlbum", "images"), image) for image in images] + [
+        (("data", "getAlbum", "chat"), {"ttlLeft": 10})
+    ]
+
+
+def test_json_stream_parser_incomplete():
+    parser = JsonStreamParser(("images",))
+    assert parser.feed(b'{"images": [{"id": 1}, {"id"') == [(("images",), {"id": 1})]
+    with pytest.raises(ValueError):
+        parser.close()
@@ -0,0 +1,16 @@
+from unsee_dl.listing_cache import ListingCache
+
+
+def test_listing_cache(tmp_path):
+    cache = ListingCache(str(tmp_path / "listings.db"), max_age=60)
+    cache.open()
+
+    album = {"images": [{"id": "image"}], "ttl": {"ttlLeft": 120}}
+    cache.put("album", album)
+    assert cache.get("album") == album
+    assert cache.get("other") is None
+
+    cache.put("expired", {"images": [], "ttl": {"ttlLeft": 0}})
+    assert cache.get("expired") is None
+
+    cache.close()
@@ -0,0 +1,41 @@
+import asyncio
+import io
+import os
+
+from main import read_album_ids, read_lines
+
+
+def test_read_album_ids_dedupes_and_skips_invalid_urls():
+    inputs = [io.StringIO("#abcd1234\n\nhttps://example.com/#x\n#abcd1234\n#efgh\n")]
+
+    async def run():
+        return [
+            album_id async for album_id in read_album_ids(["#efgh", "#ijkl"], inputs)
+        ]
+
+    album_ids = asyncio.new_event_loop().run_until_complete(run())
+    assert album_ids == ["efgh", "ijkl", "abcd1234"]
+
+
+def test_read_lines_streams_slow_producers():
+    read_fd, write_fd = os.pipe()
+    writer = os.fdopen(write_fd, "w")
+    reader = os.fdopen(read_fd, "r")
+
+    async def run():
+        lines = read_lines(reader)
+        writer.write("first\n")
+        writer.flush()
+        # The producer is still writing
+        first = await asyncio.wait_for(lines.__anext__(), 5)
+        writer.write("second\n")
+        writer.close()
+        return [first] + [line async for line in lines]
+
+    try:
+        assert asyncio.new_event_loop().run_until_complete(run()) == [
+            "first\n",
+            "second\n",
+        ]
+    finally:
+        reader.close()
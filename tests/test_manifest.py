@@ -0,0 +1,21 @@
+import asyncio
+
+from unsee_dl.filesink import FileSink
+from unsee_dl.manifest import Manifest
+
+
+def test_manifest(tmp_path):
+    sink = FileSink()
+    manifest = Manifest(str(tmp_path))
+    manifest.add("album", "image", 10, "hash")
+    manifest.add("album", "image", 12, "new hash")
+    asyncio.new_event_loop().run_until_complete(manifest.flush(sink))
+    sink.close()
+
+    manifest = Manifest(str(tmp_path))
+    manifest.load()
+    images = manifest.get_album("album")
+    assert images["image"]["size"] == 12
+    assert manifest.is_downloaded(images, {"id": "image", "hash": "new hash"})
+    assert not manifest.is_downloaded(images, {"id": "image", "hash": "hash"})
+    assert not manifest.is_downloaded(images, {"id": "other", "hash": "new hash"})
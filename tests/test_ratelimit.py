@@ -0,0 +1,24 @@
+import asyncio
+import time
+
+from unsee_dl.ratelimit import RateLimiter, TokenBucket
+
+
+def test_token_bucket_overdraws_and_waits():
+    bucket = TokenBucket(rate=100, burst=10)
+    assert bucket.take(10) == 0
+    assert 0.4 < bucket.take(50) <= 0.5
+
+
+def test_rate_limiter_limits_bytes():
+    limiter = RateLimiter(bytes_per_second=1000)
+
+    async def run():
+        start = time.monotonic()
+        for _ in range(3):
+            await limiter.receive(500)
+        await limiter.request()
+        return time.monotonic() - start
+
+    elapsed = asyncio.new_event_loop().run_until_complete(run())
+    assert 0.4 < elapsed < 1
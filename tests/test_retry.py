@@ -0,0 +1,59 @@
+import asyncio
+
+import aiohttp
+import pytest
+
+from unsee_dl.retry import (
+    CircuitBreaker,
+    CircuitOpenError,
+    Retrier,
+    RetryPolicy,
+    parse_retry_after,
+)
+
+
+def _response_error(status, headers=None):
+    return aiohttp.ClientResponseError(None, (), status=status, headers=headers)
+
+
+def test_retrier_retries_transient_errors():
+    calls = []
+
+    async def flaky():
+        calls.append(len(calls))
+        if len(calls) < 3:
+            raise _response_error(503, {"Retry-After": "0"})
+        return "ok"
+
+    async def not_found():
+        calls.append(len(calls))
+        raise _response_error(404)
+
+    async def run():
+        retrier = Retrier({"default": RetryPolicy(3, base_delay=0)})
+        assert await retrier.run("listing", "host", flaky) == "ok"
+        with pytest.raises(aiohttp.ClientResponseError):
+            await retrier.run("listing", "host", not_found)
+
+    asyncio.new_event_loop().run_until_complete(run())
+
+    assert len(calls) == 4
+
+
+def test_circuit_breaker_opens_after_failures():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    breaker.check("host")
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        breaker.check("host")
+
+    breaker.record_success()
+    breaker.check("host")
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("2") == 2
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
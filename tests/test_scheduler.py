@@ -0,0 +1,94 @@
+import asyncio
+
+from unsee_dl.scheduler import Stage, run_bounded, run_pipeline, split_stream
+
+
+def test_run_bounded():
+    in_flight = 0
+    max_in_flight = 0
+    done = []
+
+    async def worker(item):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        done.append(item)
+
+    asyncio.new_event_loop().run_until_complete(run_bounded(range(10), worker, 3))
+
+    assert sorted(done) == list(range(10))
+    assert max_in_flight == 3
+
+
+def test_run_bounded_waits_for_cancelled_workers():
+    cleaned = []
+
+    async def worker(item):
+        if item == 0:
+            await asyncio.sleep(0.01)
+            raise ValueError(item)
+        try:
+            await asyncio.sleep(10)
+        finally:
+            await asyncio.sleep(0.01)
+            cleaned.append(item)
+
+    async def run():
+        try:
+            await run_bounded(range(3), worker, 3)
+        except ValueError:
+            return list(cleaned)
+
+    assert asyncio.new_event_loop().run_until_complete(run()) == [1, 2]
+
+
+def test_run_pipeline_keeps_partition_order():
+    written = []
+
+    async def split(item, emit):
+        for part in range(3):
+            await asyncio.sleep(0.001 * (item % 3))
+            await emit((item, part))
+
+    async def write(message, emit):
+        await asyncio.sleep(0.001 * (message[1] % 2))
+        written.append(message)
+
+    async def items():
+        for item in range(10):
+            yield item
+
+    asyncio.new_event_loop().run_until_complete(
+        run_pipeline(
+            items(),
+            [
+                Stage(split, concurrency=4),
+                Stage(write, concurrency=3, partition=lambda message: message[0]),
+            ],
+        )
+    )
+
+    assert len(written) == 30
+    for item in range(10):
+        assert [m for m in written if m[0] == item] == [(item, p) for p in range(3)]
+
+
+def test_split_stream_routes_items_lazily():
+    async def items():
+        for item in range(10):
+            yield item
+
+    async def collect(stream):
+        return [item async for item in stream]
+
+    async def run():
+        routing, even, odd = split_stream(items(), lambda item: item % 2 == 0)
+        results = await asyncio.gather(collect(even), collect(odd))
+        await routing
+        return results
+
+    even, odd = asyncio.new_event_loop().run_until_complete(run())
+    assert even == [0, 2, 4, 6, 8]
+    assert odd == [1, 3, 5, 7, 9]
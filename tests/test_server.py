@@ -0,0 +1,57 @@
+import asyncio
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from unsee_dl.server import DownloadServer
+
+
+def test_server_runs_and_cancels_jobs():
+    release = None
+
+    async def download(album_ids, dry_run, result):
+        for album_id in album_ids:
+            if album_id == "t5jy62MGOCbRucOi":
+                await release.wait()
+            result.add_completed(album_id)
+
+    async def run():
+        nonlocal release
+        release = asyncio.Event()
+        server = DownloadServer(download)
+        async with TestClient(TestServer(server.create_app())) as client:
+            response = await client.post(
+                "/jobs", json={"albums": ["#243dbd04", "https://example.com/#x"]}
+            )
+            assert response.status == 201
+            job = await response.json()
+            assert job["albums"] == ["243dbd04"]
+            assert job["rejected"] == ["https://example.com/#x"]
+
+            response = await client.post(
+                "/jobs", json={"albums": ["t5jy62MGOCbRucOh", "t5jy62MGOCbRucOi"]}
+            )
+            slow_job = await response.json()
+            await asyncio.sleep(0)
+
+            response = await client.get("/jobs/{}".format(job["id"]))
+            job = await response.json()
+            assert job["status"] == "completed"
+            assert job["completed"] == ["243dbd04"]
+
+            # Albums are reported while the job runs, and kept once it is cancelled
+            response = await client.get("/jobs/{}".format(slow_job["id"]))
+            slow_job = await response.json()
+            assert slow_job["status"] == "running"
+            assert slow_job["completed"] == ["t5jy62MGOCbRucOh"]
+
+            response = await client.delete("/jobs/{}".format(slow_job["id"]))
+            slow_job = await response.json()
+            assert slow_job["status"] == "cancelled"
+            assert slow_job["completed"] == ["t5jy62MGOCbRucOh"]
+
+            response = await client.post("/jobs", json={"albums": "243dbd04"})
+            assert response.status == 400
+            response = await client.get("/jobs/unknown")
+            assert response.status == 404
+
+    asyncio.new_event_loop().run_until_complete(run())
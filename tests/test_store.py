@@ -0,0 +1,17 @@
+from unsee_dl.store import ContentStore
+
+
+def test_content_store(tmp_path):
+    store = ContentStore(str(tmp_path))
+    image = tmp_path / "album" / "image.jpg"
+    image.parent.mkdir()
+    image.write_bytes(b"image")
+
+    assert store.link_out("abcdef", tmp_path / "other" / "image.jpg") is None
+
+    store.add(image, "abcdef")
+    assert store.get_path("abcdef").read_bytes() == b"image"
+    assert store.link_out("abcdef", tmp_path / "other" / "image.jpg") == 5
+    assert (tmp_path / "other" / "image.jpg").read_bytes() == b"image"
+
+    assert store.get_path("../escape") is None
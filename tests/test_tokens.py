@@ -0,0 +1,78 @@
+import asyncio
+import base64
+import json
+import time
+
+from unsee_dl.tokens import TokenManager
+
+
+def _jwt(expires):
+    payload = base64.urlsafe_b64encode(json.dumps({"exp": expires}).encode())
+    return "header.{}.signature".format(payload.decode().rstrip("="))
+
+
+def test_token_manager_reuses_cached_tokens(tmp_path):
+    logins = []
+
+    async def login(album_id):
+        logins.append(album_id)
+        return _jwt(time.time() + 3600 + len(logins))
+
+    async def run():
+        cache_path = tmp_path / "tokens.json"
+
+        tokens = TokenManager(login, cache_path)
+        first, second = await asyncio.gather(tokens.get("album"), tokens.get("album"))
+        assert first == second
+        await tokens.stop()
+
+        tokens = TokenManager(login, cache_path)
+        tokens.load()
+        assert await tokens.get("album") == first
+        assert await tokens.refresh("album", "rejected") == first
+        assert await tokens.refresh("album", first) != first
+
+    asyncio.new_event_loop().run_until_complete(run())
+
+    assert logins == ["album", "album"]
+
+
+def test_token_manager_merges_cache_of_other_processes(tmp_path):
+    async def login(album_id):
+        return _jwt(time.time() + 3600)
+
+    async def run():
+        cache_path = tmp_path / "tokens.json"
+        first = TokenManager(login, cache_path)
+        second = TokenManager(login, cache_path)
+        first.load()
+        second.load()
+
+        first_token = await first.get("first")
+        second_token = await second.get("second")
+        await first.stop()
+        await second.stop()
+
+        tokens = TokenManager(login, cache_path)
+        tokens.load()
+        assert tokens._tokens["first"][0] == first_token
+        assert tokens._tokens["second"][0] == second_token
+
+    asyncio.new_event_loop().run_until_complete(run())
+
+
+def test_token_manager_forgets_expired_tokens():
+    async def login(album_id):
+        return _jwt(time.time() + 3600)
+
+    async def run():
+        tokens = TokenManager(login)
+        await tokens.get("current")
+        tokens._tokens["expired"] = ("token", time.time() - 1)
+
+        tokens.start(check_interval=0.01)
+        await asyncio.sleep(0.05)
+        await tokens.stop()
+        return set(tokens._tokens)
+
+    assert asyncio.new_event_loop().run_until_complete(run()) == {"current"}
@@ -1,4 +1,8 @@
-from unsee_dl.unsee_old import get_album_id_from_url, is_beta_album_id
+from unsee_dl.unsee import (
+    classify_album_urls,
+    get_album_id_from_url,
+    is_beta_album_id,
+)
 
 
 def test_get_album_id_from_url():
@@ -7,8 +11,26 @@ def test_get_album_id_from_url():
         get_album_id_from_url("https://beta-app.unsee.cc/#t5jy62MGOCbRucOh")
         == "t5jy62MGOCbRucOh"
     )
+    assert get_album_id_from_url("#243dbd04") == "243dbd04"
+    assert get_album_id_from_url("https://example.com/#243dbd04") is None
+    assert get_album_id_from_url("https://unsee.cc/243dbd04") is None
 
 
 def test_is_beta_album_id():
     assert not is_beta_album_id("243dbd04")
     assert is_beta_album_id("t5jy62MGOCbRucOh")
+
+
+def test_classify_album_urls():
+    album_urls = classify_album_urls(
+        [
+            "https://old.unsee.cc/#243dbd04",
+            "unsee.cc/#t5jy62MGOCbRucOh",
+            "t5jy62MGOCbRucOi",
+            "https://example.com/#243dbd04",
+            "",
+        ]
+    )
+    assert album_urls.old == ["243dbd04"]
+    assert album_urls.new == ["t5jy62MGOCbRucOh", "t5jy62MGOCbRucOi"]
+    assert album_urls.rejected == ["https://example.com/#243dbd04", ""]
@@ -0,0 +1,131 @@
+import asyncio
+import json
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from unsee_dl import unsee_new
+from unsee_dl.unsee_new import Client, build_album_query
+from unsee_dl.unsee_old import UnseeImage
+
+
+def test_build_album_query():
+    query = build_album_query()
+    assert "images { id urlBig: url(size: big) hash }" in query
+    assert "fragment" not in query
+
+    query = build_album_query(["chat"])
+    assert "chat { ...ChatFragment }" in query
+    assert "fragment ChatFragment on Chat" in query
+    assert "SessionFragment" not in query
+
+    with pytest.raises(ValueError):
+        build_album_query(["unknown"])
+
+
+def test_failed_album_releases_its_token():
+    client = Client(session=object())
+
+    async def login(album_id):
+        return "token"
+
+    async def graphql_events(body, album_id, token, parser):
+        raise ValueError("listing failed")
+        yield
+
+    client.tokens.login = login
+    client._graphql_events = graphql_events
+    with pytest.raises(ValueError):
+        asyncio.new_event_loop().run_until_complete(client.list_album_images("album"))
+
+    assert not client.tokens._active
+
+
+def test_cached_listing_needs_no_token(tmp_path):
+    client = Client(session=object(), listing_cache=str(tmp_path / "listings.db"))
+    client.listing_cache.open()
+    client.listing_cache.put("album", {"images": [{"id": "image", "urlBig": "url"}]})
+
+    async def login(album_id):
+        raise AssertionError("logged in for a cached listing")
+
+    client.tokens.login = login
+    album_images = asyncio.new_event_loop().run_until_complete(
+        client.list_album_images("album")
+    )
+
+    assert [image["id"] for image in album_images] == ["image"]
+    client.listing_cache.close()
+    client.sink.close()
+
+
+def test_download_album_resumes_only_the_same_image_version(tmp_path, monkeypatch):
+    content = bytes(range(256)) * 4
+    requests = []
+
+    async def image(request):
+        requests.append(dict(request.headers))
+        headers = {"ETag": '"v2"'}
+        range_header = request.headers.get("Range")
+        if range_header and request.headers.get("If-Range", '"v2"') == '"v2"':
+            start = int(range_header[len("bytes=") : -1])
+            if start >= len(content):
+                return web.Response(status=416, headers=headers)
+            return web.Response(status=206, body=content[start:], headers=headers)
+        return web.Response(body=content, headers=headers)
+
+    app = web.Application()
+    app.router.add_get("/image", image)
+    album = {"images": [{"id": "image", "urlBig": "image", "hash": "h2"}]}
+    image_file = UnseeImage("album", "image", str(tmp_path), False, "h2")
+    part_path = image_file.get_stream_part_path()
+    validator_path = image_file.get_stream_validator_path()
+
+    async def download(part, validator):
+        part_path.write_bytes(part)
+        if validator is not None:
+            validator_path.write_text(json.dumps(validator))
+        del requests[:]
+
+        async with TestServer(app) as server:
+            monkeypatch.setattr(unsee_new, "_BASE_URL", str(server.make_url("")))
+            async with Client(
+                out_path=str(tmp_path),
+                group_album=False,
+                listing_cache=str(tmp_path / "listings.db"),
+            ) as client:
+                client.listing_cache.put("album", album)
+                await client.download_album("album")
+
+        assert image_file.get_stream_file_path().read_bytes() == content
+        assert not part_path.exists()
+        assert not validator_path.exists()
+        return requests
+
+    async def run():
+        # 206, the rest of the same version
+        current = {"hash": "h2", "etag": '"v2"', "last_modified": None}
+        (sent,) = await download(content[:100], current)
+        assert sent["Range"] == "bytes=100-"
+        assert sent["If-Range"] == '"v2"'
+
+        # 416, the part file is complete
+        (sent,) = await download(content, current)
+        assert sent["Range"] == "bytes={}-".format(len(content))
+
+        # 200, the image changed since the part file was written
+        changed = {"hash": "h2", "etag": '"v1"', "last_modified": None}
+        (sent,) = await download(b"old" * 50, changed)
+        assert sent["If-Range"] == '"v1"'
+
+        # Part files of another hash, or of an unknown version, are not resumed
+        for validator in ({"hash": "h1", "etag": '"v2"'}, None):
+            (sent,) = await download(b"old" * 50, validator)
+            assert "Range" not in sent
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(run())
+    finally:
+        loop.close()
@@ -0,0 +1,16 @@
+from unsee_dl.unsee_old import ImageTracker
+
+
+def test_image_tracker():
+    tracker = ImageTracker(3)
+    assert tracker.missing == 3
+
+    tracker.mark()
+    tracker.mark()
+    assert tracker.missing == 1
+    assert not tracker.done
+
+    tracker.mark()
+    tracker.mark()
+    assert tracker.missing == 0
+    assert tracker.done
@@ -0,0 +1,67 @@
+READ_FIXED = "fixed"
+READ_ANY = "any"
+READ_AUTO = "auto"
+READ_STRATEGIES = (READ_FIXED, READ_ANY, READ_AUTO)
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def get_read_size(strategy, chunk_size=DEFAULT_CHUNK_SIZE, content_length=None):
+    """
+    Get the maximum size of each read for a strategy
+    :param strategy: read strategy, one of READ_STRATEGIES
+    :type strategy: str
+    :param chunk_size: size of each read for the fixed strategy
+    :type chunk_size: int
+    :param content_length: length of the body, if known
+    :type content_length: int
+    :return: maximum size of each read, None to read whatever is buffered
+    :rtype: Optional[int]
+    """
+    if strategy == READ_FIXED:
+        return chunk_size
+    elif strategy == READ_ANY:
+        return None
+    elif strategy == READ_AUTO:
+        if content_length:
+            return max(chunk_size, min(content_length, MAX_CHUNK_SIZE))
+        return None
+    raise ValueError("Unknown read strategy {}".format(strategy))
+
+
+async def iter_chunks(
+    stream,
+    strategy=READ_AUTO,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    content_length=None,
+    limiter=None,
+):
+    """
+    Read a stream in chunks
+    :param stream: source stream
+    :type stream: aiohttp.StreamReader
+    :param strategy: read strategy, one of READ_STRATEGIES
+    :type strategy: str
+    :param chunk_size: size of each read for the fixed strategy
+    :type chunk_size: int
+    :param content_length: length of the body, used to size the reads of the auto strategy
+    :type content_length: int
+    :param limiter: rate limiter the chunks are accounted to
+    :type limiter: RateLimiter
+    :return: generator of chunks
+    :rtype: AsyncGenerator[bytes]
+    """
+    read_size = get_read_size(strategy, chunk_size, content_length)
+
+    while True:
+        if read_size is None:
+            chunk = await stream.readany()
+        else:
+            chunk = await stream.read(read_size)
+        if not chunk:
+            break
+        if limiter:
+            # Waiting here leaves the next bytes in the socket, slowing the sender down
+            await limiter.receive(len(chunk))
+        yield chunk
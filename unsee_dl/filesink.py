@@ -0,0 +1,163 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+DEFAULT_IO_WORKERS = 4
+DEFAULT_WRITE_BATCH_SIZE = 256 * 1024
+
+# Directories known to exist, so that each one is created once per process
+_known_dirs = set()
+
+
+def ensure_dir(path):
+    """
+    Create a directory and its parents, unless already done by this process
+    :param path: directory path
+    :type path: Path
+    """
+    key = str(path)
+    if key in _known_dirs:
+        return
+    Path(path).mkdir(parents=True, exist_ok=True)
+    _known_dirs.add(key)
+
+
+def in_dir(path, func, *args):
+    """
+    Call a function writing in a directory, creating the directory first. A directory
+    removed since it was created, e.g. between the jobs of a server, is created again.
+    :param path: directory path
+    :type path: Path
+    :param func: function called with args
+    :type func: Callable
+    :return: result of func
+    """
+    ensure_dir(path)
+    try:
+        return func(*args)
+    except FileNotFoundError:
+        _known_dirs.discard(str(path))
+        ensure_dir(path)
+        return func(*args)
+
+
+class SinkFile:
+    def __init__(self, sink, file, batch_size):
+        """
+        File opened by a FileSink, buffering writes until a batch is full
+        :param sink: sink running the file operations
+        :type sink: FileSink
+        :param file: binary file object
+        :param batch_size: bytes buffered before being written
+        :type batch_size: int
+        """
+        self.sink = sink
+        self.file = file
+        self.name = file.name
+        self.batch_size = batch_size
+        self.size = 0
+        self._buffer = []
+        self._buffered = 0
+
+    async def write(self, data):
+        self.size += len(data)
+        self._buffer.append(data)
+        self._buffered += len(data)
+        if self._buffered >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        if not self._buffer:
+            return
+        data = b"".join(self._buffer)
+        self._buffer = []
+        self._buffered = 0
+        await self.sink.run(self.file.write, data)
+
+    async def close(self):
+        try:
+            await self.flush()
+        finally:
+            await self.sink.run(self.file.close)
+
+
+class FileSink:
+    def __init__(
+        self, max_workers=DEFAULT_IO_WORKERS, batch_size=DEFAULT_WRITE_BATCH_SIZE
+    ):
+        """
+        Runs the filesystem operations in a dedicated thread pool, off the event loop
+        :param max_workers: number of filesystem threads
+        :type max_workers: int
+        :param batch_size: bytes buffered by each file before being written
+        :type batch_size: int
+        """
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="unsee-dl-io"
+        )
+        self.batch_size = batch_size
+
+    async def run(self, func, *args):
+        """
+        Run a blocking function in the filesystem threads
+        """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    async def open(self, path, mode="wb"):
+        """
+        Open a file, creating its parent directories
+        :param path: file path
+        :type path: Path
+        :param mode: binary open mode
+        :type mode: str
+        :rtype: SinkFile
+        """
+        file = await self.run(_open, Path(path), mode)
+        return SinkFile(self, file, self.batch_size)
+
+    async def write_bytes(self, path, data):
+        """
+        Write a whole file, creating its parent directories
+        :param path: file path
+        :type path: Path
+        :param data: file content
+        :type data: bytes
+        """
+        await self.run(_write_bytes, Path(path), data)
+
+    async def replace(self, src, dst):
+        """
+        Atomically rename a file, replacing the destination
+        """
+        await self.run(_replace, Path(src), Path(dst))
+
+    async def size(self, path):
+        """
+        Get the size of a file
+        :return: file size, 0 if it does not exist
+        :rtype: int
+        """
+        return await self.run(_size, Path(path))
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+def _open(path, mode):
+    return in_dir(path.parent, path.open, mode)
+
+
+def _write_bytes(path, data):
+    in_dir(path.parent, path.write_bytes, data)
+
+
+def _replace(src, dst):
+    in_dir(dst.parent, src.replace, dst)
+
+
+def _size(path):
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        return 0
@@ -0,0 +1,337 @@
+import asyncio
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+DEFAULT_LEASE = 300
+DEFAULT_MAX_ATTEMPTS = 3
+
+PENDING = "pending"
+CLAIMED = "claimed"
+COMPLETED = "completed"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    album_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_expires);
+"""
+
+
+def get_worker_id():
+    """
+    Get an id telling apart the workers of every host
+    :rtype: str
+    """
+    return "{}:{}:{}".format(socket.gethostname(), os.getpid(), uuid.uuid4().hex[:8])
+
+
+class JobQueue:
+    def __init__(self, path, lease=DEFAULT_LEASE, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """
+        Queue of album downloads in a SQLite database shared by workers. A worker claims
+        albums for a lease it renews with heartbeats, albums whose lease expired are
+        claimed again by another worker.
+        Methods are blocking and may be called from any thread.
+        :param path: database path
+        :type path: str
+        :param lease: seconds a claimed album is reserved to its worker without heartbeat
+        :type lease: float
+        :param max_attempts: number of claims of an album before it is marked failed
+        :type max_attempts: int
+        """
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max(1, max_attempts)
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def open(self):
+        with self._lock:
+            # Transactions are explicit, see _transaction
+            self._connection = sqlite3.connect(
+                self.path, timeout=60, isolation_level=None, check_same_thread=False
+            )
+            self._connection.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            if self._connection:
+                self._connection.close()
+                self._connection = None
+
+    def _transaction(self, statements):
+        """
+        Run statements in a write transaction, locking the database from its start so
+        that concurrent workers don't read the same rows
+        :param statements: function called with the connection
+        :type statements: Callable[[sqlite3.Connection], Any]
+        :return: result of statements
+        """
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                result = statements(self._connection)
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+            return result
+
+    def enqueue(self, album_ids):
+        """
+        Add albums to the queue, albums already queued are left as they are
+        :param album_ids: album ids
+        :type album_ids: Iterable[str]
+        :return: number of albums added
+        :rtype: int
+        """
+        now = time.time()
+
+        def insert(connection):
+            before = connection.total_changes
+            connection.executemany(
+                "INSERT OR IGNORE INTO jobs (album_id, status, updated_at) "
+                "VALUES (?, ?, ?)",
+                ((album_id, PENDING, now) for album_id in album_ids),
+            )
+            return connection.total_changes - before
+
+        return self._transaction(insert)
+
+    def claim(self, worker_id, count=1):
+        """
+        Claim pending albums, or albums whose worker stopped renewing its lease
+        :param worker_id: id of the claiming worker
+        :type worker_id: str
+        :param count: maximum number of albums claimed
+        :type count: int
+        :return: claimed album ids
+        :rtype: List[str]
+        """
+        now = time.time()
+
+        def update(connection):
+            while True:
+                rows = connection.execute(
+                    "SELECT album_id, attempts FROM jobs WHERE status = ? "
+                    "OR (status = ? AND lease_expires <= ?) LIMIT ?",
+                    (PENDING, CLAIMED, now, count),
+                ).fetchall()
+                if not rows:
+                    return []
+
+                album_ids = []
+                for album_id, attempts in rows:
+                    if attempts < self.max_attempts:
+                        album_ids.append(album_id)
+                    else:
+                        # Its workers kept dying while downloading it
+                        connection.execute(
+                            "UPDATE jobs SET status = ?, worker = NULL, "
+                            "lease_expires = NULL, error = ?, updated_at = ? "
+                            "WHERE album_id = ?",
+                            (FAILED, "Too many attempts", now, album_id),
+                        )
+                if album_ids:
+                    connection.executemany(
+                        "UPDATE jobs SET status = ?, worker = ?, lease_expires = ?, "
+                        "attempts = attempts + 1, updated_at = ? WHERE album_id = ?",
+                        (
+                            (CLAIMED, worker_id, now + self.lease, now, album_id)
+                            for album_id in album_ids
+                        ),
+                    )
+                    return album_ids
+
+        return self._transaction(update)
+
+    def heartbeat(self, worker_id):
+        """
+        Renew the lease of the albums claimed by a worker
+        :param worker_id: worker id
+        :type worker_id: str
+        :return: number of albums still claimed by the worker
+        :rtype: int
+        """
+        now = time.time()
+
+        def update(connection):
+            return connection.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE status = ? AND worker = ?",
+                (now + self.lease, CLAIMED, worker_id),
+            ).rowcount
+
+        return self._transaction(update)
+
+    def complete(self, worker_id, album_id):
+        """
+        Mark an album downloaded, unless its lease was lost to another worker
+        :param worker_id: worker id
+        :type worker_id: str
+        :param album_id: album id
+        :type album_id: str
+        :return: whether the album was still claimed by the worker
+        :rtype: bool
+        """
+        return self._release(worker_id, album_id, "?", (COMPLETED,), None)
+
+    def fail(self, worker_id, album_id, error=None):
+        """
+        Release an album that failed, to be claimed again until max_attempts
+        :param worker_id: worker id
+        :type worker_id: str
+        :param album_id: album id
+        :type album_id: str
+        :param error: description of the failure
+        :type error: str
+        :return: whether the album was still claimed by the worker
+        :rtype: bool
+        """
+        return self._release(
+            worker_id,
+            album_id,
+            "CASE WHEN attempts >= ? THEN ? ELSE ? END",
+            (self.max_attempts, FAILED, PENDING),
+            error,
+        )
+
+    def _release(self, worker_id, album_id, status, status_parameters, error):
+        # Albums whose lease was lost are left to the worker that claimed them since
+        now = time.time()
+
+        def update(connection):
+            return connection.execute(
+                "UPDATE jobs SET status = {}, worker = NULL, lease_expires = NULL, "
+                "error = ?, updated_at = ? "
+                "WHERE album_id = ? AND status = ? AND worker = ?".format(status),
+                status_parameters + (error, now, album_id, CLAIMED, worker_id),
+            ).rowcount
+
+        return self._transaction(update) > 0
+
+    def is_drained(self, worker_id):
+        """
+        Check whether no album is left to claim, now or once a lease expires
+        :param worker_id: id of the asking worker, whose own claims are ignored
+        :type worker_id: str
+        :rtype: bool
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT 1 FROM jobs WHERE status = ? "
+                "OR (status = ? AND worker != ?) LIMIT 1",
+                (PENDING, CLAIMED, worker_id),
+            ).fetchone()
+        return row is None
+
+    def get_counts(self):
+        """
+        :return: number of albums of each status
+        :rtype: Dict[str, int]
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+            ).fetchall()
+        return dict(rows)
+
+
+class Worker:
+    def __init__(self, queue, worker_id, claim_size=1, poll_interval=5):
+        """
+        Claims albums of a job queue for a worker and releases them once downloaded.
+        Queue calls run in the default executor, the database is shared with other
+        hosts and may be slow or locked.
+        :param queue: opened job queue
+        :type queue: JobQueue
+        :param worker_id: worker id
+        :type worker_id: str
+        :param claim_size: number of albums claimed at once
+        :type claim_size: int
+        :param poll_interval: seconds between two claims while other workers hold the
+            remaining albums
+        :type poll_interval: float
+        """
+        self.queue = queue
+        self.worker_id = worker_id
+        self.claim_size = max(1, claim_size)
+        self.poll_interval = poll_interval
+        self._claimed = set()
+        self._releases = set()
+        self._released = None
+
+    def run(self, func, *args):
+        return asyncio.get_event_loop().run_in_executor(None, func, *args)
+
+    async def album_ids(self):
+        """
+        Claim albums until none is left to any worker
+        :rtype: AsyncIterator[str]
+        """
+        while True:
+            album_ids = await self.run(self.queue.claim, self.worker_id, self.claim_size)
+            if album_ids:
+                logging.debug("Claimed albums {}".format(album_ids))
+                self._claimed.update(album_ids)
+                for album_id in album_ids:
+                    yield album_id
+            elif self._claimed:
+                # Albums of this worker still downloading may fail and be pending again
+                self._released = asyncio.get_event_loop().create_future()
+                await self._released
+            elif await self.run(self.queue.is_drained, self.worker_id):
+                return
+            else:
+                # The albums left are claimed by other workers, they are claimed
+                # again if their worker dies
+                await asyncio.sleep(self.poll_interval)
+
+    def release(self, album_id, completed, error=None):
+        """
+        Mark a claimed album completed, or failed to be claimed again
+        :param album_id: album id
+        :type album_id: str
+        :param completed: whether the album was downloaded
+        :type completed: bool
+        :param error: description of the failure, recorded in the queue
+        :type error: str
+        """
+        if completed:
+            release = self.run(self.queue.complete, self.worker_id, album_id)
+        else:
+            release = self.run(self.queue.fail, self.worker_id, album_id, error)
+        future = asyncio.ensure_future(release)
+        self._releases.add(future)
+
+        def on_released(_):
+            self._releases.discard(future)
+            self._claimed.discard(album_id)
+            if self._released is not None and not self._released.done():
+                self._released.set_result(None)
+
+        future.add_done_callback(on_released)
+
+    async def heartbeat(self):
+        """
+        Renew the lease of the albums claimed by the worker
+        """
+        await self.run(self.queue.heartbeat, self.worker_id)
+
+    async def wait_released(self):
+        """
+        Wait for the releases sent to the database
+        """
+        if self._releases:
+            await asyncio.gather(*self._releases)
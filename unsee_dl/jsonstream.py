@@ -0,0 +1,192 @@
+import codecs
+import json
+import re
+
+_STRUCTURAL = re.compile(r'[{}\[\]",:]')
+_STRING_END = re.compile(r'["\\]')
+
+
+class JsonStreamParser:
+    def __init__(self, items_path, value_paths=()):
+        """
+        Incremental JSON parser, decoding selected values as soon as they are complete
+        :param items_path: path of an array whose elements are decoded one by one
+        :type items_path: Iterable[Union[str, int]]
+        :param value_paths: paths of values decoded as a whole
+        :type value_paths: Iterable[Iterable[Union[str, int]]]
+        """
+        self.items_path = tuple(items_path)
+        self.value_paths = set(tuple(path) for path in value_paths)
+
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._pos = 0
+        # Open containers, as [kind, key] with key the current object key or array index
+        self._stack = []
+        self._expect_key = False
+        self._in_string = False
+        self._string_start = None
+        self._string_is_key = False
+        # Start of a value not yet known to be a string or container, i.e. a scalar
+        self._value_start = None
+        self._capture_start = None
+        self._capture_depth = None
+        self._capture_path = None
+        self._done = False
+
+    def feed(self, data):
+        """
+        Parse a chunk of the document
+        :param data: next chunk of the document
+        :type data: bytes
+        :return: decoded values, as (path, value). Array items are reported with the path of
+            their array.
+        :rtype: List[Tuple[tuple, Any]]
+        """
+        self._buffer += self._decoder.decode(data)
+        events = []
+        self._parse(events)
+        self._compact()
+        return events
+
+    def close(self):
+        """
+        Complete the parsing, checking the document ended
+        :return: decoded values left, as (path, value)
+        :rtype: List[Tuple[tuple, Any]]
+        """
+        self._buffer += self._decoder.decode(b"", final=True)
+        events = []
+        self._parse(events)
+        if self._value_start is not None and not self._stack:
+            # Top level scalar document
+            self._end_scalar(len(self._buffer), events)
+        if self._stack or self._in_string or not self._done:
+            raise ValueError("Incomplete JSON document")
+        return events
+
+    def _path(self):
+        return tuple(key for _, key in self._stack)
+
+    def _start_value(self, position):
+        path = self._path()
+        if self._capture_start is not None:
+            return
+        if self._stack and self._stack[-1][0] == "[" and path[:-1] == self.items_path:
+            capture_path = self.items_path
+        elif path in self.value_paths:
+            capture_path = path
+        else:
+            return
+        self._capture_start = position
+        self._capture_depth = len(self._stack)
+        self._capture_path = capture_path
+
+    def _end_value(self, end, events):
+        if self._capture_start is not None and self._capture_depth == len(self._stack):
+            value = json.loads(self._buffer[self._capture_start : end])
+            events.append((self._capture_path, value))
+            self._capture_start = None
+            self._capture_depth = None
+            self._capture_path = None
+        if not self._stack:
+            self._done = True
+
+    def _end_scalar(self, end, events):
+        if self._buffer[self._value_start : end].strip():
+            self._start_value(self._value_start)
+            self._end_value(end, events)
+        self._value_start = None
+
+    def _parse(self, events):
+        buffer = self._buffer
+        pos = self._pos
+
+        while True:
+            if self._in_string:
+                match = _STRING_END.search(buffer, pos)
+                if match is None:
+                    pos = len(buffer)
+                    break
+                if match.group() == "\\":
+                    if match.end() >= len(buffer):
+                        # Escaped character not received yet
+                        pos = match.start()
+                        break
+                    pos = match.end() + 1
+                    continue
+
+                pos = match.end()
+                self._in_string = False
+                if self._string_is_key:
+                    self._stack[-1][1] = json.loads(buffer[self._string_start : pos])
+                    self._expect_key = False
+                else:
+                    self._end_value(pos, events)
+                self._string_start = None
+                continue
+
+            match = _STRUCTURAL.search(buffer, pos)
+            if match is None:
+                if self._value_start is None and buffer[pos:].strip():
+                    self._value_start = pos
+                pos = len(buffer)
+                break
+
+            char = match.group()
+            index = match.start()
+            pos = match.end()
+
+            if char in ",}]" and self._value_start is not None:
+                self._end_scalar(index, events)
+            elif self._value_start is not None:
+                self._value_start = None
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = index
+                self._string_is_key = (
+                    self._expect_key and self._stack and self._stack[-1][0] == "{"
+                )
+                if not self._string_is_key:
+                    self._start_value(index)
+            elif char in "{[":
+                self._start_value(index)
+                self._stack.append([char, None if char == "{" else 0])
+                self._expect_key = char == "{"
+                if char == "[":
+                    self._value_start = pos
+            elif char in "}]":
+                self._stack.pop()
+                self._expect_key = False
+                self._end_value(pos, events)
+            elif char == ":":
+                self._value_start = pos
+            elif char == ",":
+                if self._stack[-1][0] == "{":
+                    self._expect_key = True
+                else:
+                    self._stack[-1][1] += 1
+                    self._value_start = pos
+
+        self._pos = pos
+
+    def _compact(self):
+        """
+        Drop the parsed text no longer needed
+        """
+        keep = self._pos
+        for start in (self._capture_start, self._string_start, self._value_start):
+            if start is not None:
+                keep = min(keep, start)
+        if keep <= 0:
+            return
+
+        self._buffer = self._buffer[keep:]
+        self._pos -= keep
+        if self._capture_start is not None:
+            self._capture_start -= keep
+        if self._string_start is not None:
+            self._string_start -= keep
+        if self._value_start is not None:
+            self._value_start -= keep
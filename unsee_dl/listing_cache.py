@@ -0,0 +1,98 @@
+import json
+import sqlite3
+import threading
+import time
+
+DEFAULT_MAX_AGE = 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS albums (
+    album_id TEXT PRIMARY KEY,
+    album TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+)
+"""
+
+
+class ListingCache:
+    def __init__(self, path, max_age=DEFAULT_MAX_AGE):
+        """
+        SQLite cache of album listings. A listing is fresh for max_age seconds, or until the
+        album expires if its ttlLeft is sooner.
+        Methods are blocking and may be called from any thread.
+        :param path: database path
+        :type path: str
+        :param max_age: seconds a listing is fresh
+        :type max_age: float
+        """
+        self.path = path
+        self.max_age = max_age
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def open(self):
+        """
+        Open the database, evicting the listings no longer fresh
+        """
+        with self._lock:
+            # Download processes share the cache, WAL lets them read while one writes
+            self._connection = sqlite3.connect(
+                self.path, timeout=30, check_same_thread=False
+            )
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(_SCHEMA)
+            self._connection.commit()
+        self.evict()
+
+    def close(self):
+        with self._lock:
+            if self._connection:
+                self._connection.close()
+                self._connection = None
+
+    def get(self, album_id):
+        """
+        Get the cached listing of an album
+        :param album_id: album id
+        :type album_id: str
+        :return: getAlbum result, None if not cached or no longer fresh
+        :rtype: Optional[dict]
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT album FROM albums WHERE album_id = ? AND expires_at > ?",
+                (album_id, time.time()),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, album_id, album):
+        """
+        Cache the listing of an album
+        :param album_id: album id
+        :type album_id: str
+        :param album: getAlbum result
+        :type album: dict
+        """
+        now = time.time()
+        ttl = self.max_age
+        ttl_left = (album.get("ttl") or {}).get("ttlLeft")
+        if isinstance(ttl_left, (int, float)):
+            ttl = min(ttl, ttl_left)
+
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO albums VALUES (?, ?, ?, ?)",
+                (album_id, json.dumps(album), now, now + ttl),
+            )
+            self._connection.commit()
+
+    def evict(self):
+        """
+        Remove the listings no longer fresh
+        """
+        with self._lock:
+            self._connection.execute(
+                "DELETE FROM albums WHERE expires_at <= ?", (time.time(),)
+            )
+            self._connection.commit()
@@ -0,0 +1,98 @@
+import json
+import logging
+import threading
+from pathlib import Path
+
+MANIFEST_FILE_NAME = ".unsee-dl-manifest.jsonl"
+
+
+class Manifest:
+    def __init__(self, out_path):
+        """
+        Record of the images downloaded in an output directory, stored as a JSON lines log
+        of (album, image id, size, server hash)
+        :param out_path: output path
+        :type out_path: str
+        """
+        self.path = Path(out_path).joinpath(MANIFEST_FILE_NAME)
+        self.albums = {}
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        Read the manifest, compacting it when most of its entries are outdated
+        """
+        if not self.path.exists():
+            return
+
+        lines = 0
+        with self.path.open("r", encoding="utf-8") as file:
+            for line in file:
+                # noinspection PyBroadException
+                try:
+                    entry = json.loads(line)
+                    self.albums.setdefault(entry["album"], {})[entry["id"]] = entry
+                    lines += 1
+                except Exception:
+                    logging.warning("Ignoring invalid manifest entry: {}".format(line))
+
+        entries = sum(len(images) for images in self.albums.values())
+        if lines > 2 * entries:
+            self._rewrite()
+
+    def get_album(self, album_id):
+        """
+        Get the downloaded images of an album
+        :param album_id: album id
+        :type album_id: str
+        :return: manifest entry of each image, by image id
+        :rtype: Dict[str, dict]
+        """
+        return self.albums.get(album_id, {})
+
+    def is_downloaded(self, album_images, image):
+        """
+        Check if an image was already downloaded and did not change since
+        :param album_images: manifest entries of the album, from get_album
+        :type album_images: Dict[str, dict]
+        :param image: image from the album listing
+        :type image: dict
+        :rtype: bool
+        """
+        entry = album_images.get(image["id"])
+        return entry is not None and entry.get("hash") == image.get("hash")
+
+    def add(self, album_id, image_id, size, image_hash=None):
+        """
+        Record a downloaded image, written to disk on the next flush
+        """
+        entry = {"album": album_id, "id": image_id, "size": size, "hash": image_hash}
+        self.albums.setdefault(album_id, {})[image_id] = entry
+        self._pending.append(json.dumps(entry) + "\n")
+
+    async def flush(self, sink):
+        """
+        Append the new entries to the manifest file
+        :param sink: sink running the file operations
+        :type sink: FileSink
+        """
+        if not self._pending:
+            return
+        data = "".join(self._pending)
+        self._pending = []
+        await sink.run(self._append, data)
+
+    def _append(self, data):
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a", encoding="utf-8") as file:
+                file.write(data)
+
+    def _rewrite(self):
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with tmp_path.open("w", encoding="utf-8") as file:
+            for images in self.albums.values():
+                for entry in images.values():
+                    file.write(json.dumps(entry) + "\n")
+        tmp_path.replace(self.path)
@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=None):
+        """
+        Token bucket refilled at a constant rate. Takes may overdraw the bucket, the taker
+        then waits until the debt is paid back, so that large takes are not starved.
+        :param rate: tokens added per second
+        :type rate: float
+        :param burst: maximum number of tokens saved while idle, defaults to one second
+            worth of tokens
+        :type burst: float
+        """
+        self.rate = rate
+        self.burst = burst if burst else rate
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def take(self, amount=1):
+        """
+        Take tokens from the bucket
+        :param amount: number of tokens
+        :type amount: float
+        :return: seconds to wait before the tokens are available
+        :rtype: float
+        """
+        self._refill()
+        self._tokens -= amount
+        if self._tokens >= 0:
+            return 0
+        return -self._tokens / self.rate
+
+    async def acquire(self, amount=1):
+        """
+        Take tokens from the bucket, waiting until they are available
+        :param amount: number of tokens
+        :type amount: float
+        """
+        delay = self.take(amount)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class RateLimiter:
+    def __init__(self, requests_per_second=0, bytes_per_second=0):
+        """
+        Limits the requests and the received bytes of every client sharing it
+        :param requests_per_second: maximum requests per second, 0 for no limit
+        :type requests_per_second: float
+        :param bytes_per_second: maximum bytes received per second, 0 for no limit
+        :type bytes_per_second: float
+        """
+        self.requests = TokenBucket(requests_per_second) if requests_per_second else None
+        self.bytes = TokenBucket(bytes_per_second) if bytes_per_second else None
+
+    async def request(self):
+        """
+        Wait until a request can be sent
+        """
+        if self.requests:
+            await self.requests.acquire()
+
+    async def receive(self, size):
+        """
+        Account for received bytes, waiting until the rate is back under the limit
+        :param size: number of bytes received
+        :type size: int
+        """
+        if self.bytes and size > 0:
+            await self.bytes.acquire(size)
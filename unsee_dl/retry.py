@@ -0,0 +1,219 @@
+import asyncio
+import email.utils
+import logging
+import random
+import time
+
+import aiohttp
+
+RETRYABLE_STATUSES = frozenset((408, 429, 500, 502, 503, 504))
+
+DEFAULT_RETRIES = 3
+DEFAULT_IMAGE_RETRIES = 5
+DEFAULT_BASE_DELAY = 0.5
+DEFAULT_MAX_DELAY = 30
+DEFAULT_FAILURE_THRESHOLD = 10
+DEFAULT_RESET_TIMEOUT = 30
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, host, retry_after):
+        super().__init__("Too many failures on {}, retrying later".format(host))
+        self.host = host
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+        reset_timeout=DEFAULT_RESET_TIMEOUT,
+    ):
+        """
+        Stops the requests to a host after consecutive failures, letting a single request
+        through once reset_timeout has passed
+        :param failure_threshold: consecutive failures opening the circuit, 0 to disable
+        :type failure_threshold: int
+        :param reset_timeout: seconds the circuit stays open
+        :type reset_timeout: float
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+
+    def check(self, host):
+        """
+        :raises CircuitOpenError: if requests to the host are stopped
+        """
+        if self.opened_at is None:
+            return
+
+        now = time.monotonic()
+        remaining = self.opened_at + self.reset_timeout - now
+        if remaining > 0:
+            raise CircuitOpenError(host, remaining)
+        # Let this request probe the host, the others wait for its outcome
+        self.opened_at = now
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failure_threshold and self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class RetryPolicy:
+    def __init__(
+        self,
+        attempts=DEFAULT_RETRIES,
+        base_delay=DEFAULT_BASE_DELAY,
+        max_delay=DEFAULT_MAX_DELAY,
+    ):
+        """
+        :param attempts: maximum number of attempts
+        :type attempts: int
+        :param base_delay: delay in seconds before the first retry, doubled on each retry
+        :type base_delay: float
+        :param max_delay: maximum delay in seconds between attempts
+        :type max_delay: float
+        """
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def get_delay(self, attempt, retry_after=None):
+        """
+        Get the delay before a retry: exponential backoff with full jitter, or the delay
+        requested by the server
+        :param attempt: number of the failed attempt, from 0
+        :type attempt: int
+        :param retry_after: delay requested by the server, in seconds
+        :type retry_after: float
+        :rtype: float
+        """
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+def parse_retry_after(value):
+    """
+    Parse a Retry-After header, either seconds or an http date
+    :return: delay in seconds, None if missing or invalid
+    :rtype: Optional[float]
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date is None:
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+def is_retryable(ex):
+    if isinstance(ex, aiohttp.ClientResponseError):
+        return ex.status in RETRYABLE_STATUSES
+    return isinstance(
+        ex,
+        (
+            CircuitOpenError,
+            aiohttp.ClientConnectionError,
+            aiohttp.ClientPayloadError,
+            asyncio.TimeoutError,
+        ),
+    )
+
+
+def _get_retry_after(ex):
+    if isinstance(ex, CircuitOpenError):
+        return ex.retry_after
+    if isinstance(ex, aiohttp.ClientResponseError) and ex.headers:
+        return parse_retry_after(ex.headers.get("Retry-After"))
+    return None
+
+
+class Retrier:
+    def __init__(
+        self,
+        policies=None,
+        failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+        reset_timeout=DEFAULT_RESET_TIMEOUT,
+    ):
+        """
+        Retries failed requests according to the policy of their operation, with a circuit
+        breaker for each host
+        :param policies: retry policy of each operation, the "default" one is used for the
+            operations without their own
+        :type policies: Dict[str, RetryPolicy]
+        :param failure_threshold: consecutive failures on a host stopping its requests
+        :type failure_threshold: int
+        :param reset_timeout: seconds the requests to a failing host are stopped
+        :type reset_timeout: float
+        """
+        self.policies = dict(policies or {})
+        self.policies.setdefault("default", RetryPolicy())
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers = {}
+
+    def get_breaker(self, host):
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            breaker = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            self._breakers[host] = breaker
+        return breaker
+
+    async def run(self, operation, host, func):
+        """
+        Call a coroutine function, retrying it on transient errors
+        :param operation: name of the operation, selecting the retry policy
+        :type operation: str
+        :param host: host the operation sends requests to
+        :type host: str
+        :param func: coroutine function making one attempt
+        :type func: Callable[[], Awaitable]
+        :return: result of func
+        """
+        policy = self.policies.get(operation, self.policies["default"])
+        breaker = self.get_breaker(host)
+
+        attempt = 0
+        while True:
+            try:
+                breaker.check(host)
+                result = await func()
+            except Exception as ex:
+                if not isinstance(ex, CircuitOpenError):
+                    if is_retryable(ex):
+                        breaker.record_failure()
+                    else:
+                        # The host answered, the request itself is wrong
+                        breaker.record_success()
+
+                attempt += 1
+                if attempt >= policy.attempts or not is_retryable(ex):
+                    raise
+
+                delay = policy.get_delay(attempt - 1, _get_retry_after(ex))
+                logging.debug(
+                    "Retrying {} on {} in {:.1f}s after: {!r}".format(
+                        operation, host, delay, ex
+                    )
+                )
+                await asyncio.sleep(delay)
+                continue
+
+            breaker.record_success()
+            return result
@@ -0,0 +1,288 @@
+import asyncio
+import itertools
+
+
+class DownloadResult:
+    def __init__(self, completed=None, failed=None, on_done=None):
+        """
+        :param completed: ids of the albums downloaded successfully
+        :type completed: list
+        :param failed: ids of the albums that failed
+        :type failed: list
+        :param on_done: function called with each album id, whether it was downloaded
+            successfully and the description of its failure, as soon as the album is
+            done
+        :type on_done: Callable[[str, bool, Optional[str]], Any]
+        """
+        self.completed = completed if completed is not None else []
+        self.failed = failed if failed is not None else []
+        self.on_done = on_done
+
+    def add_completed(self, album_id):
+        self.completed.append(album_id)
+        if self.on_done:
+            self.on_done(album_id, True, None)
+
+    def add_failed(self, album_id, error=None):
+        """
+        :param album_id: album id
+        :type album_id: str
+        :param error: description of the failure
+        :type error: str
+        """
+        self.failed.append(album_id)
+        if self.on_done:
+            self.on_done(album_id, False, error)
+
+
+async def run_bounded(items, worker, concurrency=1):
+    """
+    Run a coroutine function over each item, with a bounded number of calls in flight
+    :param items: items to process, consumed lazily
+    :type items: Union[Iterable, AsyncIterable]
+    :param worker: coroutine function called with each item
+    :type worker: Callable[[Any], Awaitable]
+    :param concurrency: maximum number of concurrent calls
+    :type concurrency: int
+    """
+    concurrency = max(1, concurrency)
+
+    if hasattr(items, "__aiter__"):
+        await _run_bounded_async(items, worker, concurrency)
+        return
+
+    iterator = iter(items)
+
+    async def consume():
+        for item in iterator:
+            await worker(item)
+
+    await _gather_or_cancel([consume() for _ in range(concurrency)])
+
+
+async def _run_bounded_async(items, worker, concurrency):
+    # An async iterator can't be advanced by many consumers at once, so a single
+    # producer hands the items over through a queue
+    queue = asyncio.Queue(maxsize=concurrency)
+    done = object()
+
+    async def produce():
+        async for item in items:
+            await queue.put(item)
+        for _ in range(concurrency):
+            await queue.put(done)
+
+    async def consume():
+        while True:
+            item = await queue.get()
+            if item is done:
+                return
+            await worker(item)
+
+    await _gather_or_cancel([produce()] + [consume() for _ in range(concurrency)])
+
+
+async def _gather_or_cancel(coroutines):
+    # Like asyncio.gather, but the other calls are cancelled as soon as one fails
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        # The cancelled calls may still be cleaning up, e.g. writing through files the
+        # caller closes next
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def chunked(items, size):
+    """
+    Split items in lists of at most `size` items, consuming them lazily
+    :param items: items to split
+    :type items: Iterable
+    :param size: maximum size of each chunk
+    :type size: int
+    :return: generator of chunks
+    :rtype: Generator[list]
+    """
+    iterator = iter(items)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+async def chunked_async(items, size):
+    """
+    Split items in lists of at most `size` items, consuming them lazily
+    :param items: items to split
+    :type items: Union[Iterable, AsyncIterable]
+    :param size: maximum size of each chunk
+    :type size: int
+    :return: generator of chunks
+    :rtype: AsyncGenerator[list]
+    """
+    if not hasattr(items, "__aiter__"):
+        for chunk in chunked(items, size):
+            yield chunk
+        return
+
+    chunk = []
+    async for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def split_stream(items, predicate, queue_size=1):
+    """
+    Split items in two streams, consuming them lazily. Both streams must be consumed
+    concurrently, each one holds at most queue_size items waiting.
+    :param items: items to split
+    :type items: Union[Iterable, AsyncIterable]
+    :param predicate: function selecting the items of the first stream
+    :type predicate: Callable[[Any], bool]
+    :param queue_size: maximum number of items waiting in each stream
+    :type queue_size: int
+    :return: task routing the items, the items matching predicate, the other items
+    :rtype: Tuple[asyncio.Future, AsyncGenerator, AsyncGenerator]
+    """
+    done = object()
+    matching = asyncio.Queue(maxsize=max(1, queue_size))
+    others = asyncio.Queue(maxsize=max(1, queue_size))
+
+    async def put(item):
+        await (matching if predicate(item) else others).put(item)
+
+    async def route():
+        try:
+            if hasattr(items, "__aiter__"):
+                async for item in items:
+                    await put(item)
+            else:
+                for item in items:
+                    await put(item)
+        except Exception:
+            # Ends both streams, the error is raised by the routing task
+            await matching.put(done)
+            await others.put(done)
+            raise
+        await matching.put(done)
+        await others.put(done)
+
+    async def drain(queue):
+        while True:
+            item = await queue.get()
+            if item is done:
+                return
+            yield item
+
+    return asyncio.ensure_future(route()), drain(matching), drain(others)
+
+
+class Stage:
+    def __init__(self, worker, concurrency=1, queue_size=1, partition=None):
+        """
+        :param worker: coroutine function called with each item of the stage and the
+            coroutine function emitting an item to the next stage
+        :type worker: Callable[[Any, Callable[[Any], Awaitable]], Awaitable]
+        :param concurrency: number of workers of the stage
+        :type concurrency: int
+        :param queue_size: maximum number of items waiting for a worker
+        :type queue_size: int
+        :param partition: function mapping an item to a key, items with the same key are
+            processed in order by the same worker
+        :type partition: Callable[[Any], Hashable]
+        """
+        self.worker = worker
+        self.concurrency = max(1, concurrency)
+        self.queue_size = max(1, queue_size)
+        self.partition = partition
+
+
+async def run_pipeline(items, stages):
+    """
+    Run items through stages connected by bounded queues. Every stage runs its own workers,
+    emitting to a full queue waits for the next stage to catch up.
+    :param items: items of the first stage, consumed lazily
+    :type items: Union[Iterable, AsyncIterable]
+    :param stages: pipeline stages
+    :type stages: List[Stage]
+    """
+    done = object()
+
+    queues = []
+    for stage in stages:
+        count = stage.concurrency if stage.partition else 1
+        queues.append([asyncio.Queue(maxsize=stage.queue_size) for _ in range(count)])
+
+    def make_emit(index):
+        if index >= len(stages):
+
+            async def emit_nowhere(item):
+                pass
+
+            return emit_nowhere
+
+        stage = stages[index]
+        stage_queues = queues[index]
+
+        async def emit(item):
+            if stage.partition:
+                queue = stage_queues[hash(stage.partition(item)) % len(stage_queues)]
+            else:
+                queue = stage_queues[0]
+            await queue.put(item)
+
+        return emit
+
+    async def close(index):
+        if index >= len(stages):
+            return
+        if stages[index].partition:
+            for queue in queues[index]:
+                await queue.put(done)
+        else:
+            for _ in range(stages[index].concurrency):
+                await queues[index][0].put(done)
+
+    async def produce():
+        emit = make_emit(0)
+        if hasattr(items, "__aiter__"):
+            async for item in items:
+                await emit(item)
+        else:
+            for item in items:
+                await emit(item)
+        await close(0)
+
+    def make_workers(index):
+        stage = stages[index]
+        emit = make_emit(index + 1)
+        running = stage.concurrency
+
+        async def work(queue):
+            nonlocal running
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                await stage.worker(item, emit)
+
+            running -= 1
+            if running == 0:
+                await close(index + 1)
+
+        if stage.partition:
+            return [work(queue) for queue in queues[index]]
+        return [work(queues[index][0]) for _ in range(stage.concurrency)]
+
+    workers = []
+    for index in range(len(stages)):
+        workers.extend(make_workers(index))
+
+    await _gather_or_cancel([produce()] + workers)
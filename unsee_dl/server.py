@@ -0,0 +1,243 @@
+import asyncio
+import collections
+import logging
+import os
+import signal
+import time
+import uuid
+
+from aiohttp import web
+
+from .scheduler import DownloadResult
+from .unsee import classify_album_urls
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8733
+DEFAULT_MAX_JOBS = 4
+DEFAULT_MAX_FINISHED_JOBS = 1000
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class Job:
+    def __init__(self, album_ids, dry_run=False, rejected=()):
+        """
+        :param album_ids: ids of the albums to download
+        :type album_ids: List[str]
+        :param dry_run: only list the album images
+        :type dry_run: bool
+        :param rejected: submitted urls that are not album urls
+        :type rejected: Iterable[str]
+        """
+        self.id = uuid.uuid4().hex
+        self.album_ids = album_ids
+        self.dry_run = dry_run
+        self.rejected = list(rejected)
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.task = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    @property
+    def done(self):
+        return self.status in (COMPLETED, FAILED, CANCELLED)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "albums": self.album_ids,
+            "dry_run": self.dry_run,
+            "rejected": self.rejected,
+            "completed": self.result.completed if self.result else [],
+            "failed": self.result.failed if self.result else [],
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+
+class DownloadServer:
+    def __init__(
+        self,
+        download,
+        max_jobs=DEFAULT_MAX_JOBS,
+        max_finished_jobs=DEFAULT_MAX_FINISHED_JOBS,
+    ):
+        """
+        Runs download jobs submitted over http, reusing the same clients for every job
+        :param download: coroutine function downloading album ids, called with the album
+            ids, the dry run flag and the result the albums are added to as they finish
+        :type download: Callable[[List[str], bool, DownloadResult], Awaitable]
+        :param max_jobs: number of jobs run at the same time
+        :type max_jobs: int
+        :param max_finished_jobs: number of finished jobs kept for status requests
+        :type max_finished_jobs: int
+        """
+        self.download = download
+        self.max_finished_jobs = max_finished_jobs
+        self.jobs = collections.OrderedDict()
+        self._slots = asyncio.Semaphore(max(1, max_jobs))
+        self._finished = collections.deque()
+
+    def submit(self, album_urls, dry_run=False):
+        """
+        Queue a download job
+        :param album_urls: album urls or ids
+        :type album_urls: Iterable[str]
+        :param dry_run: only list the album images
+        :type dry_run: bool
+        :return: queued job
+        :rtype: Job
+        """
+        album_urls = classify_album_urls(album_urls)
+        # Each album once
+        album_ids = list(
+            collections.OrderedDict.fromkeys(album_urls.old + album_urls.new)
+        )
+        job = Job(album_ids, dry_run, album_urls.rejected)
+
+        self.jobs[job.id] = job
+        job.task = asyncio.ensure_future(self._run(job))
+        return job
+
+    def cancel(self, job_id):
+        """
+        Cancel a job, albums already downloaded are kept
+        :param job_id: job id
+        :type job_id: str
+        :return: cancelled job, None if unknown
+        :rtype: Optional[Job]
+        """
+        job = self.jobs.get(job_id)
+        if job is not None and not job.done:
+            job.task.cancel()
+            self._finish(job, CANCELLED)
+        return job
+
+    async def cancel_all(self):
+        tasks = [job.task for job in self.jobs.values() if not job.done]
+        for job_id in list(self.jobs):
+            self.cancel(job_id)
+        if tasks:
+            await asyncio.wait(tasks)
+
+    async def _run(self, job):
+        async with self._slots:
+            job.status = RUNNING
+            job.started = time.time()
+            # Filled as the albums finish, for the status of running and cancelled jobs
+            job.result = DownloadResult()
+            # noinspection PyBroadException
+            try:
+                await self.download(job.album_ids, job.dry_run, job.result)
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:
+                logging.error("Job {} failed.".format(job.id), exc_info=ex)
+                job.error = str(ex)
+                self._finish(job, FAILED)
+                return
+
+        self._finish(job, FAILED if job.result.failed else COMPLETED)
+
+    def _finish(self, job, status):
+        if job.done:
+            return
+        job.status = status
+        job.finished = time.time()
+
+        # Forget the oldest finished jobs
+        self._finished.append(job.id)
+        while len(self._finished) > self.max_finished_jobs:
+            self.jobs.pop(self._finished.popleft(), None)
+
+    def create_app(self):
+        """
+        Create the http application of the jobs API:
+            POST /jobs {"albums": [...], "dry_run": false} submits a job
+            GET /jobs lists the jobs
+            GET /jobs/{id} gets the status of a job
+            DELETE /jobs/{id} cancels a job
+        :rtype: aiohttp.web.Application
+        """
+        app = web.Application()
+        app.router.add_post("/jobs", self._post_job)
+        app.router.add_get("/jobs", self._get_jobs)
+        app.router.add_get("/jobs/{job_id}", self._get_job)
+        app.router.add_delete("/jobs/{job_id}", self._delete_job)
+        return app
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None):
+        """
+        Serve the jobs API until SIGINT or SIGTERM
+        :param host: address to listen on
+        :type host: str
+        :param port: port to listen on
+        :type port: int
+        :param socket_path: unix socket to listen on instead of host and port
+        :type socket_path: str
+        """
+        runner = web.AppRunner(self.create_app())
+        await runner.setup()
+        if socket_path:
+            site = web.UnixSite(runner, socket_path)
+        else:
+            site = web.TCPSite(runner, host, port)
+        await site.start()
+        print("Serving on {}".format(socket_path if socket_path else site.name))
+
+        stop = asyncio.Event()
+        loop = asyncio.get_event_loop()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signal_number, stop.set)
+            except (NotImplementedError, RuntimeError):
+                # Not supported on this platform, KeyboardInterrupt stops the loop
+                pass
+
+        try:
+            await stop.wait()
+        finally:
+            await runner.cleanup()
+            await self.cancel_all()
+            if socket_path and os.path.exists(socket_path):
+                os.unlink(socket_path)
+
+    async def _post_job(self, request):
+        try:
+            body = await request.json()
+        except ValueError:
+            raise web.HTTPBadRequest(text="Invalid JSON body")
+
+        album_urls = body.get("albums") if isinstance(body, dict) else None
+        if not isinstance(album_urls, list) or not all(
+            isinstance(album_url, str) for album_url in album_urls
+        ):
+            raise web.HTTPBadRequest(text='"albums" must be a list of album urls')
+
+        job = self.submit(album_urls, bool(body.get("dry_run", False)))
+        return web.json_response(job.to_dict(), status=201)
+
+    async def _get_jobs(self, request):
+        return web.json_response([job.to_dict() for job in self.jobs.values()])
+
+    async def _get_job(self, request):
+        job = self.jobs.get(request.match_info["job_id"])
+        if job is None:
+            raise web.HTTPNotFound(text="Unknown job")
+        return web.json_response(job.to_dict())
+
+    async def _delete_job(self, request):
+        job = self.cancel(request.match_info["job_id"])
+        if job is None:
+            raise web.HTTPNotFound(text="Unknown job")
+        return web.json_response(job.to_dict())
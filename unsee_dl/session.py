@@ -0,0 +1,48 @@
+import ssl
+
+import aiohttp
+
+DEFAULT_CONNECTIONS = 100
+DEFAULT_KEEPALIVE_TIMEOUT = 15
+DEFAULT_DNS_CACHE_TTL = 300
+
+_ssl_context = None
+
+
+def get_ssl_context():
+    """
+    Get the TLS context shared by every connection, so that it is created once
+    :rtype: ssl.SSLContext
+    """
+    global _ssl_context
+    if _ssl_context is None:
+        _ssl_context = ssl.create_default_context()
+    return _ssl_context
+
+
+def create_session(
+    limit=DEFAULT_CONNECTIONS,
+    limit_per_host=0,
+    keepalive_timeout=DEFAULT_KEEPALIVE_TIMEOUT,
+    ttl_dns_cache=DEFAULT_DNS_CACHE_TTL,
+):
+    """
+    Create an http session whose connection pool can be shared by the clients
+    :param limit: maximum number of connections, 0 for no limit
+    :type limit: int
+    :param limit_per_host: maximum number of connections per host, 0 for no limit
+    :type limit_per_host: int
+    :param keepalive_timeout: seconds an idle connection is kept open for reuse
+    :type keepalive_timeout: float
+    :param ttl_dns_cache: seconds DNS resolutions are cached
+    :type ttl_dns_cache: float
+    :rtype: aiohttp.ClientSession
+    """
+    connector = aiohttp.TCPConnector(
+        limit=limit,
+        limit_per_host=limit_per_host,
+        keepalive_timeout=keepalive_timeout,
+        ttl_dns_cache=ttl_dns_cache,
+        ssl=get_ssl_context(),
+    )
+    return aiohttp.ClientSession(connector=connector)
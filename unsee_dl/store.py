@@ -0,0 +1,109 @@
+import errno
+import logging
+import os
+import re
+import shutil
+from pathlib import Path
+
+from unsee_dl.filesink import in_dir
+
+STORE_DIR_NAME = ".unsee-dl-store"
+
+_VALID_HASH = re.compile(r"^[A-Za-z0-9_\-]{2,128}$")
+# FICLONE ioctl, cloning a file on copy-on-write filesystems (Btrfs, XFS)
+_FICLONE = 0x40049409
+
+
+class ContentStore:
+    def __init__(self, out_path):
+        """
+        Store of the downloaded images by server hash, shared by the albums of an output path
+        :param out_path: output path
+        :type out_path: str
+        """
+        self.path = Path(out_path).joinpath(STORE_DIR_NAME)
+
+    def get_path(self, image_hash):
+        """
+        Get the store path of an image
+        :param image_hash: image hash reported by the server
+        :type image_hash: str
+        :return: store path, None if the hash can't be used as a file name
+        :rtype: Optional[Path]
+        """
+        if not image_hash or not _VALID_HASH.match(image_hash):
+            return None
+        return self.path.joinpath(image_hash[:2], image_hash)
+
+    def link_out(self, image_hash, dst):
+        """
+        Link a stored image to an output path
+        :param image_hash: image hash reported by the server
+        :type image_hash: str
+        :param dst: output path
+        :type dst: Path
+        :return: size of the linked image, None if it is not stored
+        :rtype: Optional[int]
+        """
+        src = self.get_path(image_hash)
+        if src is None or not src.exists():
+            return None
+
+        dst = Path(dst)
+        tmp_path = dst.with_name(dst.name + ".link")
+        if tmp_path.exists():
+            tmp_path.unlink()
+        in_dir(dst.parent, _link, src, tmp_path)
+        tmp_path.replace(dst)
+
+        return dst.stat().st_size
+
+    def add(self, src, image_hash):
+        """
+        Add a downloaded image to the store, unless an image with the same hash is stored
+        :param src: downloaded image path
+        :type src: Path
+        :param image_hash: image hash reported by the server
+        :type image_hash: str
+        """
+        dst = self.get_path(image_hash)
+        if dst is None or dst.exists():
+            return
+
+        try:
+            in_dir(dst.parent, _link, Path(src), dst)
+        except FileExistsError:
+            pass
+
+
+def _link(src, dst):
+    """
+    Hard link a file, falling back to a reflink or a copy across filesystems
+    """
+    try:
+        os.link(str(src), str(dst))
+        return
+    except OSError as ex:
+        if ex.errno == errno.EEXIST:
+            raise
+        logging.debug("Hard link of {} failed: {}".format(src, ex))
+
+    if not _reflink(src, dst):
+        shutil.copyfile(str(src), str(dst))
+
+
+def _reflink(src, dst):
+    try:
+        import fcntl
+    except ImportError:
+        return False
+
+    with src.open("rb") as src_file, dst.open("wb") as dst_file:
+        try:
+            fcntl.ioctl(dst_file.fileno(), _FICLONE, src_file.fileno())
+            return True
+        except OSError:
+            pass
+
+    dst.unlink()
+    return False
@@ -0,0 +1,238 @@
+import asyncio
+import base64
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+def _get_token_expiry(token, default_ttl):
+    """
+    Get the expiry time of a token, reading the `exp` claim when the token is a JWT
+    :param token: anonymous token
+    :type token: str
+    :param default_ttl: lifetime in seconds assumed when the token has no expiry
+    :type default_ttl: float
+    :return: expiry timestamp
+    :rtype: float
+    """
+    parts = token.split(".")
+    if len(parts) == 3:
+        payload = parts[1] + "=" * (-len(parts[1]) % 4)
+        # noinspection PyBroadException
+        try:
+            claims = json.loads(base64.urlsafe_b64decode(payload))
+            if "exp" in claims:
+                return float(claims["exp"])
+        except Exception:
+            pass
+
+    return time.time() + default_ttl
+
+
+class TokenManager:
+    def __init__(self, login, cache_path=None, default_ttl=3600, refresh_margin=60):
+        """
+        Anonymous tokens of the albums. /auth scopes a token to the album it is
+        requested for, so tokens are kept, cached and refreshed per album id.
+        :param login: coroutine function requesting a new token for an album id
+        :type login: Callable[[str], Awaitable[str]]
+        :param cache_path: path of the on-disk token cache, None to keep tokens in memory only
+        :type cache_path: str
+        :param default_ttl: lifetime in seconds of tokens without an expiry
+        :type default_ttl: float
+        :param refresh_margin: seconds before expiry when a token is refreshed
+        :type refresh_margin: float
+        """
+        self.login = login
+        self.cache_path = Path(cache_path) if cache_path else None
+        self.default_ttl = default_ttl
+        self.refresh_margin = refresh_margin
+        self._tokens = {}
+        self._active = set()
+        self._pending = {}
+        self._refresh_task = None
+
+    def load(self):
+        """
+        Load the non expired tokens from the on-disk cache
+        """
+        now = time.time()
+        for album_id, (token, expires) in self._read_cache().items():
+            if expires - self.refresh_margin > now:
+                self._tokens[album_id] = (token, expires)
+
+    def save(self):
+        """
+        Write the non expired tokens to the on-disk cache, merged with the tokens saved
+        meanwhile by other processes sharing it
+        """
+        if not self.cache_path:
+            return
+
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock_cache():
+            tokens = self._read_cache()
+            for album_id, entry in self._tokens.items():
+                if album_id not in tokens or tokens[album_id][1] < entry[1]:
+                    tokens[album_id] = entry
+
+            now = time.time()
+            tokens = {
+                album_id: {"token": token, "expires": expires}
+                for album_id, (token, expires) in tokens.items()
+                if expires > now
+            }
+
+            tmp_path = self.cache_path.with_name(
+                "{}.{}.tmp".format(self.cache_path.name, os.getpid())
+            )
+            with tmp_path.open("w") as file:
+                json.dump(tokens, file)
+            os.replace(str(tmp_path), str(self.cache_path))
+
+    def _read_cache(self):
+        """
+        :return: token and expiry of the albums in the on-disk cache
+        :rtype: Dict[str, Tuple[str, float]]
+        """
+        if not self.cache_path or not self.cache_path.exists():
+            return {}
+
+        # noinspection PyBroadException
+        try:
+            with self.cache_path.open("r") as file:
+                tokens = json.load(file)
+            return {
+                album_id: (entry["token"], entry["expires"])
+                for album_id, entry in tokens.items()
+            }
+        except Exception as ex:
+            logging.warning(
+                "Ignoring invalid token cache {}".format(self.cache_path), exc_info=ex
+            )
+            return {}
+
+    @contextmanager
+    def _lock_cache(self):
+        # Processes sharing the cache save it one at a time
+        if fcntl is None:
+            yield
+            return
+
+        lock_path = self.cache_path.with_name(self.cache_path.name + ".lock")
+        with lock_path.open("a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def start(self, check_interval=30):
+        """
+        Start refreshing in background the tokens used in this session before they expire
+        :param check_interval: seconds between expiry checks
+        :type check_interval: float
+        """
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.ensure_future(
+                self._refresh_loop(check_interval)
+            )
+
+    async def stop(self):
+        """
+        Stop the background refresh and save the cache
+        """
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+        self.save()
+
+    async def get(self, album_id):
+        """
+        Get a valid token for the album, logging in only when no fresh token is known
+        :param album_id: album id
+        :type album_id: str
+        :return: anonymous token
+        :rtype: str
+        """
+        self._active.add(album_id)
+        entry = self._tokens.get(album_id)
+        if entry and entry[1] - self.refresh_margin > time.time():
+            return entry[0]
+
+        return await self.refresh(album_id)
+
+    def release(self, album_id):
+        """
+        Stop refreshing in background the token of an album no longer in use
+        :param album_id: album id
+        :type album_id: str
+        """
+        self._active.discard(album_id)
+
+    async def refresh(self, album_id, stale_token=None):
+        """
+        Request a new token for the album. Concurrent refreshes of an album share one login.
+        :param album_id: album id
+        :type album_id: str
+        :param stale_token: token rejected by the server, if it is not the cached one
+            another request already refreshed it and the cached token is returned
+        :type stale_token: str
+        :return: anonymous token
+        :rtype: str
+        """
+        entry = self._tokens.get(album_id)
+        if stale_token and entry and entry[0] != stale_token:
+            return entry[0]
+
+        pending = self._pending.get(album_id)
+        if pending is None:
+            pending = asyncio.ensure_future(self._login(album_id))
+            self._pending[album_id] = pending
+            pending.add_done_callback(lambda _: self._pending.pop(album_id, None))
+
+        return await asyncio.shield(pending)
+
+    async def _login(self, album_id):
+        token = await self.login(album_id)
+        self._tokens[album_id] = (token, _get_token_expiry(token, self.default_ttl))
+        return token
+
+    async def _refresh_loop(self, check_interval):
+        while True:
+            await asyncio.sleep(check_interval)
+            self._prune()
+
+            deadline = time.time() + self.refresh_margin + check_interval
+            for album_id in list(self._active):
+                entry = self._tokens.get(album_id)
+                if entry and entry[1] <= deadline:
+                    # noinspection PyBroadException
+                    try:
+                        await self.refresh(album_id)
+                        logging.debug("Refreshed token for album {}".format(album_id))
+                    except Exception as ex:
+                        logging.warning(
+                            "Failed refreshing token for album {}".format(album_id),
+                            exc_info=ex,
+                        )
+
+    def _prune(self):
+        # Forget the expired tokens, a long running server sees many albums once
+        now = time.time()
+        for album_id, (_, expires) in list(self._tokens.items()):
+            if expires <= now:
+                del self._tokens[album_id]
@@ -1,21 +1,106 @@
-from urllib.parse import urlparse
+import re
+
 from .unsee_new import DOMAIN as UNSEE_NEW_DOMAIN
 from .unsee_old import UNSEE_OLD_DOMAIN
 
+OLD = "old"
+NEW = "new"
+REJECTED = "rejected"
+
+# Hosts of the album urls, "" for bare "#<id>" fragments
+ALBUM_HOSTS = frozenset(
+    (
+        "",
+        UNSEE_OLD_DOMAIN,  # old unsee is now "old.unsee.cc"
+        UNSEE_NEW_DOMAIN,  # beta unsee is now "unsee.cc"
+        "app." + UNSEE_NEW_DOMAIN,
+        "beta-app." + UNSEE_NEW_DOMAIN,
+    )
+)
+
+# Optional url up to the fragment, then the album id. A bare id has no url nor "#".
+_ALBUM_URL = re.compile(
+    r"(?:(?:[A-Za-z][A-Za-z0-9+.-]*:)?(?://)?(?P<host>[^/?#]*)[^#]*#)?"
+    r"(?P<id>[0-9A-Za-z_-]{1,64})\Z"
+)
+
+
+class AlbumUrls:
+    def __init__(self):
+        """
+        Album ids of a list of urls, by pipeline
+        """
+        self.old = []
+        self.new = []
+        self.rejected = []
+
+
+def classify_album_url(album_url):
+    """
+    Extract the album id from an url and select the pipeline downloading it
+    :param album_url: album url, "#<id>" fragment or bare album id
+    :type album_url: str
+    :return: OLD, NEW or REJECTED, and the album id (None when rejected)
+    :rtype: Tuple[str, Optional[str]]
+    """
+    match = _ALBUM_URL.match(album_url)
+    if match is None:
+        return REJECTED, None
+
+    host = match.group("host")
+    if host and host.lower() not in ALBUM_HOSTS:
+        return REJECTED, None
+
+    album_id = match.group("id")
+    return (OLD if is_old_album_id(album_id) else NEW), album_id
+
+
+def classify_album_urls(album_urls):
+    """
+    Extract and route the album ids of many urls in one pass
+    :param album_urls: album urls, "#<id>" fragments or bare album ids
+    :type album_urls: Iterable[str]
+    :return: album ids by pipeline, and the rejected urls
+    :rtype: AlbumUrls
+    """
+    result = AlbumUrls()
+    old_append = result.old.append
+    new_append = result.new.append
+    rejected_append = result.rejected.append
+    match_url = _ALBUM_URL.match
+
+    for album_url in album_urls:
+        match = match_url(album_url)
+        if match is None:
+            rejected_append(album_url)
+            continue
+        host = match.group("host")
+        if host and host.lower() not in ALBUM_HOSTS:
+            rejected_append(album_url)
+            continue
+
+        album_id = match.group("id")
+        # is_old_album_id, inlined
+        if len(album_id) <= 8:
+            old_append(album_id)
+        else:
+            new_append(album_id)
+
+    return result
+
 
 def get_album_id_from_url(album_url):
     """
     Extracts the album id from an url
     :param album_url: album url
-    :return: album id
+    :return: album id, None if the url is not an album url
     """
-    url = urlparse(album_url)
-    if url.netloc in (UNSEE_OLD_DOMAIN,):  # old unsee is now "old.unsee.cc"
-        return url.fragment
-    elif url.netloc in ("", UNSEE_NEW_DOMAIN,):  # beta unsee is now: unsee.cc < removed empty ""
-        return url.fragment
-    return None
+    return classify_album_url(album_url)[1]
 
 
 def is_old_album_id(album_id):
     return len(album_id) <= 8
+
+
+def is_beta_album_id(album_id):
+    return not is_old_album_id(album_id)
@@ -1,104 +1,32 @@
+import asyncio
+import json
 import logging
+import sqlite3
+from pathlib import Path
 
-import aiohttp
-
+from unsee_dl.chunks import DEFAULT_CHUNK_SIZE, READ_ANY, READ_AUTO, iter_chunks
+from unsee_dl.filesink import FileSink
+from unsee_dl.jsonstream import JsonStreamParser
+from unsee_dl.listing_cache import DEFAULT_MAX_AGE, ListingCache
+from unsee_dl.manifest import Manifest
+from unsee_dl.ratelimit import RateLimiter
+from unsee_dl.retry import Retrier
+from unsee_dl.store import ContentStore
+from unsee_dl.scheduler import Stage, run_pipeline
+from unsee_dl.session import create_session
+from unsee_dl.tokens import TokenManager
 from unsee_dl.unsee_old import UnseeImage
 
 DOMAIN = "unsee.cc"
 _BASE_URL = f"https://{DOMAIN}"
 
+# Kinds of the messages sent by the fetch stage to the write stage
+_OPEN = "open"
+_DATA = "data"
+_DONE = "done"
+_ABORT = "abort"
 
-class Client:
-    def __init__(self, session=None, out_path=".", group_album=True):
-        """
-        :param session: http session
-        :type session: aiohttp.ClientSession
-        :param out_path: output path
-        :type out_path: str
-        :param group_album: should images be grouped in folders per album
-        :type group_album: bool
-        """
-        if session:
-            self.session = session
-        else:
-            self.session = aiohttp.ClientSession()
-        self.out_path = out_path
-        self.group_album = group_album
-        self.token = None
-
-    async def __aenter__(self):
-        self._did_enter_with = True
-        return self
-
-    async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session and self._did_enter_with:
-            await self.session.close()
-
-    async def anonymous_login(self, album_id):
-        """
-        Login with an anonymous token
-        """
-        url = f"{_BASE_URL}/auth?chat={album_id}"
-        async with self.session.get(url) as response:
-            content = await response.json()
-            token = content["token"]
-            self.token = token
-
-    async def download_album(self, album_id):
-        """
-        Download an album from unsee betahttps://unsee.cc/image?id=ucGZtl0GozsxdrRf&size=small
-        :param album_id: album id
-        :type album_id: str
-        """
-        # problematic block generating invalid url error.
-        # Fixed by dgndgn with patch 
-        async for album_image in self._original_size_images(album_id):
-            image = UnseeImage(
-                album_id, album_image["id"], self.out_path, self.group_album
-            )
-            await self._download_and_save_image(image, _BASE_URL + "/" + album_image["urlBig"])
-
-    async def _original_size_images(self, album_id):
-        """
-        Get original size image for the album
-        :param album_id: unsee album id
-        :type album_id: str
-        :return: generator with each image in album
-        :rtype: Generator
-        """
-
-        # await self._create_session(album_id)
-
-        headers = {"authorization": f"Bearer {self.token}"}
-        url = f"{_BASE_URL}/graphql"
-
-        ql_body = """
-query getAlbum($chat: ID!) {
-  getAlbum(chat: $chat) {
-    chat {
-      ...ChatFragment
-      __typename
-    }
-    images {
-      ...ImageFragment
-      __typename
-    }
-    sessions {
-      ...SessionFragment
-      __typename
-    }
-    messages {
-      ...MessageFragment
-      __typename
-    }
-    pins {
-      ...PinFragment
-      __typename
-    }
-    __typename
-  }
-}
-
+_CHAT_FRAGMENT = """
 fragment ChatFragment on Chat {
   id
   title
@@ -113,21 +41,9 @@ fragment ChatFragment on Chat {
   deleteAfter
   __typename
 }
+"""
 
-fragment ImageFragment on Image {
-  id
-  session
-  chat
-  created
-  url(size: small)
-  urlBig: url(size: big)
-  hash
-  width
-  height
-  priority
-  __typename
-}
-
+_SESSION_FRAGMENT = """
 fragment SessionFragment on Session {
   id
   role
@@ -140,7 +56,9 @@ fragment SessionFragment on Session {
   name
   __typename
 }
+"""
 
+_MESSAGE_FRAGMENT = """
 fragment MessageFragment on Message {
   id
   session
@@ -153,7 +71,9 @@ fragment MessageFragment on Message {
   created
   __typename
 }
+"""
 
+_PIN_FRAGMENT = """
 fragment PinFragment on Pin {
   id
   image
@@ -164,41 +84,648 @@ fragment PinFragment on Pin {
   __typename
 }
 """
+
+# Optional album fields, as group name: (selection, fragment)
+METADATA_GROUPS = {
+    "chat": ("chat { ...ChatFragment }", _CHAT_FRAGMENT),
+    "sessions": ("sessions { ...SessionFragment }", _SESSION_FRAGMENT),
+    "messages": ("messages { ...MessageFragment }", _MESSAGE_FRAGMENT),
+    "pins": ("pins { ...PinFragment }", _PIN_FRAGMENT),
+}
+
+# Album fields requested for the client itself, not saved as metadata
+_TTL_GROUP = "ttl"
+_QUERY_GROUPS = dict(METADATA_GROUPS, **{_TTL_GROUP: ("ttl: chat { ttlLeft }", "")})
+
+
+def _album_selection(metadata_groups):
+    selections = ["images { id urlBig: url(size: big) hash }"]
+    fragments = []
+    for group in metadata_groups:
+        if group not in _QUERY_GROUPS:
+            raise ValueError("Unknown metadata group {}".format(group))
+        selection, fragment = _QUERY_GROUPS[group]
+        selections.append(selection)
+        fragments.append(fragment)
+
+    return " ".join(selections), "".join(fragments)
+
+
+def build_album_query(metadata_groups=()):
+    """
+    Build the getAlbum query, selecting only the image fields needed for the download
+    :param metadata_groups: names of the optional field groups to include, see METADATA_GROUPS
+    :type metadata_groups: Iterable[str]
+    :return: GraphQL query
+    :rtype: str
+    """
+    selection, fragments = _album_selection(metadata_groups)
+    query = "query getAlbum($chat: ID!) {{ getAlbum(chat: $chat) {{ {} }} }}".format(
+        selection
+    )
+    return query + fragments
+
+
+def _get_validator(response, image_hash):
+    """
+    Get what tells apart the version of an image being downloaded, to resume its part
+    file only if it did not change
+    :param response: response of a full image request
+    :type response: aiohttp.ClientResponse
+    :param image_hash: image hash reported by the server
+    :type image_hash: str
+    :rtype: dict
+    """
+    etag = response.headers.get("ETag")
+    return {
+        "hash": image_hash,
+        # A weak ETag can't validate a range
+        "etag": etag if etag and not etag.startswith("W/") else None,
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+
+
+def _get_resume_headers(validator, image_hash, offset):
+    """
+    Get the headers requesting the rest of a part file
+    :param validator: validator of the image version in the part file, see _get_validator
+    :type validator: dict
+    :param image_hash: image hash reported by the server
+    :type image_hash: str
+    :param offset: size of the part file
+    :type offset: int
+    :return: request headers, None if the part file holds another or an unknown version
+    :rtype: Optional[dict]
+    """
+    if not validator or validator.get("hash") != image_hash:
+        return None
+
+    headers = {"Range": "bytes={}-".format(offset)}
+    # The server sends the whole image instead if it changed since
+    if_range = validator.get("etag") or validator.get("last_modified")
+    if if_range:
+        headers["If-Range"] = if_range
+    elif not image_hash:
+        return None
+    return headers
+
+
+def _read_validator(path):
+    try:
+        with path.open("r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _remove_file(path):
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+class Client:
+    def __init__(
+        self,
+        session=None,
+        out_path=".",
+        group_album=True,
+        image_concurrency=1,
+        write_concurrency=1,
+        queue_size=16,
+        connections_per_host=0,
+        read_strategy=READ_AUTO,
+        chunk_size=DEFAULT_CHUNK_SIZE,
+        token_cache=None,
+        metadata_groups=(),
+        save_metadata=False,
+        sink=None,
+        incremental=False,
+        dedupe=False,
+        listing_cache=None,
+        listing_max_age=DEFAULT_MAX_AGE,
+        shard=False,
+        retrier=None,
+        limiter=None,
+    ):
+        """
+        :param session: http session, see create_session. It is not closed by the client.
+        :type session: aiohttp.ClientSession
+        :param out_path: output path
+        :type out_path: str
+        :param group_album: should images be grouped in folders per album
+        :type group_album: bool
+        :param image_concurrency: number of images of an album downloaded at the same time
+        :type image_concurrency: int
+        :param write_concurrency: number of images of an album written at the same time
+        :type write_concurrency: int
+        :param queue_size: maximum number of items waiting between download stages
+        :type queue_size: int
+        :param connections_per_host: maximum connections per host, 0 for no limit.
+            Ignored when a session is given.
+        :type connections_per_host: int
+        :param read_strategy: how image responses are read, one of READ_STRATEGIES
+        :type read_strategy: str
+        :param chunk_size: size of each read of the fixed read strategy
+        :type chunk_size: int
+        :param token_cache: path of the file caching anonymous tokens between runs
+        :type token_cache: str
+        :param metadata_groups: optional album field groups to request, see METADATA_GROUPS
+        :type metadata_groups: Iterable[str]
+        :param save_metadata: write the requested metadata to a json file next to the images
+        :type save_metadata: bool
+        :param sink: sink running the file operations off the event loop
+        :type sink: FileSink
+        :param incremental: download only the images not in the output path manifest
+        :type incremental: bool
+        :param dedupe: link images already downloaded for any album instead of fetching
+            them again, using a store of the images by hash
+        :type dedupe: bool
+        :param listing_cache: path of the SQLite database caching album listings
+        :type listing_cache: str
+        :param listing_max_age: seconds a cached album listing is used
+        :type listing_max_age: float
+        :param shard: spread images in directories named after the hash of their name
+        :type shard: bool
+        :param retrier: retries of the failed requests, see Retrier
+        :type retrier: Retrier
+        :param limiter: limits of the request and download rates, shared with other clients
+        :type limiter: RateLimiter
+        """
+        self._own_session = session is None
+        if session:
+            self.session = session
+        else:
+            self.session = create_session(limit_per_host=connections_per_host)
+        self.out_path = out_path
+        self.group_album = group_album
+        self.shard = shard
+        self.image_concurrency = image_concurrency
+        self.write_concurrency = write_concurrency
+        self.queue_size = queue_size
+        self.read_strategy = read_strategy
+        self.chunk_size = chunk_size
+        self.metadata_groups = tuple(metadata_groups)
+        self.query_groups = self.metadata_groups
+        self.save_metadata = save_metadata
+        self._own_sink = sink is None
+        self.sink = sink if sink else FileSink()
+        self.manifest = Manifest(out_path) if incremental else None
+        self.store = ContentStore(out_path) if dedupe else None
+        self.listing_cache = None
+        if listing_cache:
+            self.listing_cache = ListingCache(listing_cache, listing_max_age)
+            # Cached listings expire with the album
+            self.query_groups += (_TTL_GROUP,)
+        self.retrier = retrier if retrier else Retrier()
+        self.limiter = limiter if limiter else RateLimiter()
+        self.tokens = TokenManager(self.anonymous_login, token_cache)
+
+    async def __aenter__(self):
+        self._did_enter_with = True
+        self.tokens.load()
+        self.tokens.start()
+        if self.manifest:
+            await self.sink.run(self.manifest.load)
+        if self.listing_cache:
+            await self.sink.run(self.listing_cache.open)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.tokens.stop()
+        if self.listing_cache:
+            await self.sink.run(self.listing_cache.close)
+        if self.session and self._own_session and self._did_enter_with:
+            await self.session.close()
+        if self._own_sink:
+            self.sink.close()
+
+    async def anonymous_login(self, album_id):
+        """
+        Login with an anonymous token
+        :param album_id: album id the token is requested for
+        :type album_id: str
+        :return: anonymous token
+        :rtype: str
+        """
+        url = f"{_BASE_URL}/auth?chat={album_id}"
+
+        async def login():
+            await self.limiter.request()
+            async with self.session.get(url) as response:
+                response.raise_for_status()
+                content = await response.json()
+                return content["token"]
+
+        return await self.retrier.run("login", DOMAIN, login)
+
+    async def get_token(self, album_id):
+        """
+        Get an anonymous token for the album, reusing a cached one when still valid
+        :param album_id: album id
+        :type album_id: str
+        :return: anonymous token
+        :rtype: str
+        """
+        return await self.tokens.get(album_id)
+
+    async def download_album(self, album_id, token=None):
+        """
+        Download an album from unsee betahttps://unsee.cc/image?id=ucGZtl0GozsxdrRf&size=small
+        :param album_id: album id
+        :type album_id: str
+        :param token: anonymous token for the album, defaults to a cached or new token
+            when the album listing is requested
+        :type token: str
+        """
+        files = {}
+
+        async def fetch(album_image, emit):
+            image = UnseeImage(
+                album_id,
+                album_image["id"],
+                self.out_path,
+                self.group_album,
+                album_image.get("hash"),
+                self.shard,
+            )
+            # problematic block generating invalid url error.
+            # Fixed by dgndgn with patch
+            image_url = _BASE_URL + "/" + album_image["urlBig"]
+
+            # Images already downloaded for another album are linked from the store
+            if self.store and image.image_hash:
+                out_file_path = image.get_stream_file_path(create_dir=False)
+                size = await self.sink.run(
+                    self.store.link_out, image.image_hash, out_file_path
+                )
+                if size is not None:
+                    logging.debug("Linked image {} from store".format(out_file_path))
+                    if self.manifest:
+                        self.manifest.add(
+                            album_id, image.image_id, size, image.image_hash
+                        )
+                    return
+
+            await self.retrier.run(
+                "image", DOMAIN, lambda: self._fetch_image(image, image_url, emit)
+            )
+
+        async def write(message, emit):
+            image, kind, payload = message
+            if kind == _OPEN:
+                offset, validator = payload
+                file = await self.sink.open(
+                    image.get_stream_part_path(), "ab" if offset > 0 else "wb"
+                )
+                files[image] = (file, offset)
+                if validator is not None:
+                    # Written once the part file is truncated, a part file is never
+                    # left with the validator of another version
+                    await self.sink.write_bytes(
+                        image.get_stream_validator_path(),
+                        json.dumps(validator).encode("utf-8"),
+                    )
+            elif kind == _DATA:
+                await files[image][0].write(payload)
+            elif kind == _ABORT:
+                try:
+                    if image in files:
+                        file, _ = files.pop(image)
+                        await file.close()
+                finally:
+                    payload.set_result(None)
+            else:
+                file, offset = files.pop(image)
+                await file.close()
+
+                # Promote the complete file to its final name
+                out_file_path = image.get_stream_file_path(create_dir=False)
+                await self.sink.replace(file.name, out_file_path)
+                await self.sink.run(_remove_file, image.get_stream_validator_path())
+                logging.debug("Wrote image {}".format(out_file_path))
+                if self.store and image.image_hash:
+                    await self.sink.run(
+                        self.store.add, out_file_path, image.image_hash
+                    )
+                if self.manifest:
+                    self.manifest.add(
+                        album_id, image.image_id, offset + file.size, image.image_hash
+                    )
+
+        try:
+            album_images = self._original_size_images(album_id, token)
+            if self.manifest:
+                album_images = self._new_images(album_id, album_images)
+
+            await run_pipeline(
+                album_images,
+                [
+                    Stage(fetch, self.image_concurrency, self.queue_size),
+                    Stage(
+                        write,
+                        self.write_concurrency,
+                        self.queue_size,
+                        partition=lambda message: message[0].image_id,
+                    ),
+                ],
+            )
+        finally:
+            # Failed and cancelled albums no longer need a fresh token either
+            self.tokens.release(album_id)
+            # Files left open belong to interrupted downloads, their part files are
+            # resumed by the next download
+            for file, _ in files.values():
+                await file.close()
+            if self.manifest:
+                await self.manifest.flush(self.sink)
+
+    async def _fetch_image(self, image, image_url, emit):
+        """
+        Make one attempt at downloading an image, sending its content to the write stage
+        :param image: image to download
+        :type image: UnseeImage
+        :param image_url: url of the image
+        :type image_url: str
+        :param emit: function sending a message to the write stage
+        :type emit: Callable[[tuple], Awaitable]
+        """
+        # Resume from what an interrupted download left in the part file, if it holds
+        # this version of the image
+        part_path = image.get_stream_part_path()
+        offset = await self.sink.size(part_path)
+        headers = None
+        if offset > 0:
+            validator = await self.sink.run(
+                _read_validator, image.get_stream_validator_path()
+            )
+            headers = _get_resume_headers(validator, image.image_hash, offset)
+            if headers is None:
+                logging.debug("Restarting {}, another version".format(part_path))
+                offset = 0
+
+        opened = False
+        try:
+            await self.limiter.request()
+            async with self.session.get(image_url, headers=headers) as response:
+                if offset > 0 and response.status == 416:
+                    # Nothing left after the offset, the part file is complete
+                    await emit((image, _OPEN, (offset, None)))
+                    await emit((image, _DONE, None))
+                    return
+
+                response.raise_for_status()
+                validator = None
+                if response.status != 206:
+                    offset = 0
+                    validator = _get_validator(response, image.image_hash)
+                elif offset > 0:
+                    logging.debug("Resuming {} at byte {}".format(part_path, offset))
+
+                await emit((image, _OPEN, (offset, validator)))
+                opened = True
+                async for chunk in iter_chunks(
+                    response.content,
+                    self.read_strategy,
+                    self.chunk_size,
+                    response.content_length,
+                    self.limiter,
+                ):
+                    await emit((image, _DATA, chunk))
+            await emit((image, _DONE, None))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            if opened:
+                # Wait for the part file to be closed, a retry resumes from its size
+                closed = asyncio.get_event_loop().create_future()
+                await emit((image, _ABORT, closed))
+                await closed
+            raise
+
+    async def list_album_images(self, album_id, token=None):
+        """
+        List the images of an album without downloading them
+        :param album_id: album id
+        :type album_id: str
+        :param token: anonymous token for the album, defaults to a cached or new token
+            when the album listing is requested
+        :type token: str
+        :return: album images
+        :rtype: List[dict]
+        """
+        album_images = []
+        try:
+            async for album_image in self._original_size_images(album_id, token):
+                logging.info(
+                    "Image {} of album {}: {}".format(
+                        album_image["id"], album_id, album_image["urlBig"]
+                    )
+                )
+                album_images.append(album_image)
+        finally:
+            self.tokens.release(album_id)
+        return album_images
+
+    async def _new_images(self, album_id, album_images):
+        """
+        Filter out the images already downloaded according to the manifest
+        :param album_id: album id
+        :type album_id: str
+        :param album_images: images of the album
+        :type album_images: AsyncIterable[dict]
+        :return: generator of the new or changed images
+        :rtype: AsyncGenerator[dict]
+        """
+        downloaded = self.manifest.get_album(album_id)
+        skipped = 0
+        async for album_image in album_images:
+            if self.manifest.is_downloaded(downloaded, album_image):
+                skipped += 1
+            else:
+                yield album_image
+
+        if skipped > 0:
+            logging.info(
+                "Skipped {} images of album {} already downloaded".format(
+                    skipped, album_id
+                )
+            )
+
+    async def _get_cached_album(self, album_id):
+        if not self.listing_cache:
+            return None
+        try:
+            album = await self.sink.run(self.listing_cache.get, album_id)
+        except sqlite3.Error as ex:
+            logging.warning(
+                "Failed reading cached listing of album {}".format(album_id),
+                exc_info=ex,
+            )
+            return None
+        if album is not None:
+            logging.debug("Using cached listing of album {}".format(album_id))
+        return album
+
+    async def _cache_album(self, album_id, album):
+        if not self.listing_cache:
+            return
+        # The listing is already fetched, failing to cache it doesn't fail the album
+        try:
+            await self.sink.run(self.listing_cache.put, album_id, album)
+        except sqlite3.Error as ex:
+            logging.warning(
+                "Failed caching listing of album {}".format(album_id), exc_info=ex
+            )
+
+    async def _graphql_events(self, body, album_id, token, parser):
+        """
+        Send a GraphQL request and parse the response while it is received
+        :param body: request body
+        :type body: dict
+        :param album_id: album id the token was requested for
+        :type album_id: str
+        :param token: anonymous token
+        :type token: str
+        :param parser: parser of the response
+        :type parser: JsonStreamParser
+        :return: generator of the values decoded by the parser, as (path, value)
+        :rtype: AsyncGenerator[Tuple[tuple, Any]]
+        """
+        async with await self._graphql_post(body, album_id, token) as response:
+            async for chunk in iter_chunks(
+                response.content, READ_ANY, limiter=self.limiter
+            ):
+                for event in parser.feed(chunk):
+                    yield event
+            for event in parser.close():
+                yield event
+
+    async def _graphql_post(self, body, album_id, token):
+        """
+        Send a GraphQL request, retrying it on transient errors and refreshing the token
+        once if it is rejected
+        :param body: request body
+        :type body: dict
+        :param album_id: album id the token was requested for
+        :type album_id: str
+        :param token: anonymous token
+        :type token: str
+        :return: response, whose content is not read yet
+        :rtype: aiohttp.ClientResponse
+        """
+        url = f"{_BASE_URL}/graphql"
+
+        async def post():
+            nonlocal token
+            for attempt in range(2):
+                headers = {"authorization": f"Bearer {token}"}
+                await self.limiter.request()
+                response = await self.session.post(url, json=body, headers=headers)
+                if response.status == 401 and attempt == 0:
+                    response.release()
+                    logging.debug("Token rejected for album {}".format(album_id))
+                    token = await self.tokens.refresh(album_id, token)
+                    continue
+
+                response.raise_for_status()
+                return response
+
+        return await self.retrier.run("listing", DOMAIN, post)
+
+    async def _stream_album_images(self, album_id, token):
+        """
+        Get the album images, yielding each one as soon as it is received
+        :param album_id: unsee album id
+        :type album_id: str
+        :param token: anonymous token for the album
+        :type token: str
+        :return: generator with each image in album
+        :rtype: AsyncGenerator[dict]
+        """
         body = {
             "operationName": "getAlbum",
-            "query": ql_body,
+            "query": build_album_query(self.query_groups),
             "variables": {
                 "chat": album_id
             }
         }
-        async with self.session.post(url, json=body, headers=headers) as response:
-            content = await response.json()
-            if "errors" in content and len(content["errors"]) > 0:
-                raise Exception(content["errors"])
+        album_path = ("data", "getAlbum")
+        images_path = album_path + ("images",)
+        parser = JsonStreamParser(
+            images_path,
+            [("errors",)] + [album_path + (group,) for group in self.query_groups],
+        )
 
-            album_items = content["data"]["getAlbum"]["images"]
+        album = {"images": []}
+        async for path, value in self._graphql_events(body, album_id, token, parser):
+            if path == images_path:
+                if self.listing_cache:
+                    album["images"].append(value)
+                yield value
+            elif path == ("errors",):
+                if value and len(value) > 0:
+                    raise Exception(value)
+            else:
+                album[path[-1]] = value
 
-            if not album_items or len(album_items) <= 0:
-                print(f"No images found in album {album_id}")
-                return
+        if self.save_metadata and self.metadata_groups:
+            await self._save_metadata(album_id, album)
+        await self._cache_album(album_id, album)
 
-            print("Found album {} with {} images.".format(album_id, len(album_items)))
+    async def _original_size_images(self, album_id, token=None):
+        """
+        Get original size image for the album
+        :param album_id: unsee album id
+        :type album_id: str
+        :param token: anonymous token for the album, defaults to a cached or new token
+            when the listing is not cached
+        :type token: str
+        :return: generator with each image in album
+        :rtype: Generator
+        """
+        count = 0
+        album = await self._get_cached_album(album_id)
+        if album is None:
+            if token is None:
+                token = await self.get_token(album_id)
+            async for image in self._stream_album_images(album_id, token):
+                count += 1
+                yield image
+        else:
+            if self.save_metadata and self.metadata_groups:
+                await self._save_metadata(album_id, album)
 
-            for image in album_items:
+            for image in album["images"] or []:
+                count += 1
                 yield image
 
-    async def _download_and_save_image(self, image, image_url):
+        if count <= 0:
+            print(f"No images found in album {album_id}")
+        else:
+            print("Found album {} with {} images.".format(album_id, count))
+
+    async def _save_metadata(self, album_id, album):
         """
-        Download and save the image
-        :param image: unsee image
-        :type image: UnseeImage
-        :param image_url: image url
-        :type image_url: str
-        :return: saved image path
+        Write the album metadata to a json file
+        :param album_id: album id
+        :type album_id: str
+        :param album: getAlbum response
+        :type album: dict
+        :return: metadata file path
         :rtype: str
         """
-        async with self.session.get(image_url) as response:
-            image_path = await image.write_file_from_stream(response.content)
-            logging.debug("Wrote image {}".format(image_path))
+        metadata = {group: album.get(group) for group in self.metadata_groups}
+
+        out_path = Path(self.out_path)
+        if self.group_album:
+            out_path = out_path.joinpath(album_id)
+
+        out_file_path = out_path.joinpath("{}.json".format(album_id))
+        await self.sink.write_bytes(
+            out_file_path, json.dumps(metadata, indent=2).encode("utf-8")
+        )
 
-        return image_path
+        logging.debug("Wrote metadata {}".format(out_file_path))
+        return str(out_file_path)
@@ -1,19 +1,37 @@
+import asyncio
 import json
 import logging
-import ssl
 import aiohttp
 from aiohttp import WSMessage
-from hashlib import sha256
+from hashlib import md5, sha256
 from pathlib import Path
 
 from . import names
+from .filesink import FileSink, ensure_dir, in_dir
+from .ratelimit import RateLimiter
+from .session import create_session, get_ssl_context
 
 UNSEE_OLD_DOMAIN = "old.unsee.cc"
 _UNSEE_WEBSOCKET_URL = "wss://old.unsee.cc/{}/"
 
+# Seconds the image socket may stay silent before the images left are given up, the
+# server pushes every image of an album right after the pubsub announcement
+DEFAULT_RECEIVE_TIMEOUT = 30
+
+PART_SUFFIX = ".part"
+VALIDATOR_SUFFIX = ".validator"
+
 
 class UnseeImage:
-    def __init__(self, album_id, image_id=None, out_path=".", group_album=False):
+    def __init__(
+        self,
+        album_id,
+        image_id=None,
+        out_path=".",
+        group_album=False,
+        image_hash=None,
+        shard=False,
+    ):
         """
         :param album_id: album id
         :param image_id: image id
@@ -21,11 +39,18 @@ class UnseeImage:
         :type out_path: str
         :param group_album: should images be grouped in folders per album
         :type group_album: bool
+        :param image_hash: image hash reported by the server
+        :type image_hash: str
+        :param shard: spread images in two levels of directories named after the hash of
+            their file name, e.g. ab/cd/<file>
+        :type shard: bool
         """
         self.album_id = album_id
         self.image_id = image_id
         self.out_path = out_path
         self.group_album = group_album
+        self.image_hash = image_hash
+        self.shard = shard
 
     def write_file_from_blob(self, image_data):
         if not self.image_id:
@@ -33,80 +58,154 @@ class UnseeImage:
             self.image_id = "{}_{}".format(self.album_id, digest[:16])
 
         file_basename = "{}.jpg".format(self.image_id)
-        out_file_path = self._get_output_file_path(file_basename)
-
-        with out_file_path.open("wb") as file:
-            file.write(image_data)
+        out_file_path = self._get_output_file_path(file_basename, create_dir=False)
+        in_dir(out_file_path.parent, out_file_path.write_bytes, image_data)
 
         return str(out_file_path)
 
-    async def write_file_from_stream(self, stream, buffer_size=1024):
+    def get_stream_file_path(self, create_dir=True):
         """
-        Download the image from a stream
-        :param stream: source stream
-        :type stream: aiohttp.StreamReader
-        :param buffer_size: size of the chunk to read
-        :type buffer_size: int
+        Get the output path of an image downloaded by id
+        :param create_dir: create the output directory
+        :type create_dir: bool
         :return: output file path
-        :rtype: str
+        :rtype: Path
         """
         if not self.image_id:
             raise ValueError("image id not set")
 
         file_basename = "{}_{}.jpg".format(self.album_id, self.image_id)
-        out_file_path = self._get_output_file_path(file_basename)
+        return self._get_output_file_path(file_basename, create_dir)
 
-        with out_file_path.open("wb") as file:
-            while True:
-                chunk = await stream.read(buffer_size)
-                if not chunk:
-                    break
-                file.write(chunk)
+    def get_stream_part_path(self):
+        """
+        Get the path of the partial file an image is downloaded to
+        :return: part file path
+        :rtype: Path
+        """
+        out_file_path = self.get_stream_file_path(create_dir=False)
+        return out_file_path.with_name(out_file_path.name + PART_SUFFIX)
 
-        return str(out_file_path)
+    def get_stream_validator_path(self):
+        """
+        Get the path of the file recording which version of the image the partial file
+        holds
+        :return: validator file path
+        :rtype: Path
+        """
+        part_path = self.get_stream_part_path()
+        return part_path.with_name(part_path.name + VALIDATOR_SUFFIX)
 
-    def _get_output_file_path(self, file_basename):
+    def _get_output_file_path(self, file_basename, create_dir=True):
         out_path = Path(self.out_path)
         if self.group_album:
             out_path = out_path.joinpath(self.album_id)
+        if self.shard:
+            digest = md5(file_basename.encode("utf-8")).hexdigest()
+            out_path = out_path.joinpath(digest[:2], digest[2:4])
 
-        out_path.mkdir(parents=True, exist_ok=True)
+        if create_dir:
+            ensure_dir(out_path)
 
         return out_path.joinpath(file_basename)
 
 
+class ImageTracker:
+    def __init__(self, expected):
+        """
+        Counts the images of an album still to be received. Image blobs don't carry the
+        id announced by the server, so they can only be counted.
+        :param expected: number of images announced by the pubsub socket
+        :type expected: int
+        """
+        self.expected = expected
+        self.received = 0
+
+    def mark(self):
+        """
+        Mark an image as received
+        """
+        self.received += 1
+
+    @property
+    def missing(self):
+        return max(0, self.expected - self.received)
+
+    @property
+    def done(self):
+        return self.missing <= 0
+
+
 class ClientOld:
-    def __init__(self, session=None, out_path=".", group_album=True):
+    def __init__(
+        self,
+        session=None,
+        out_path=".",
+        group_album=True,
+        sink=None,
+        max_pending_images=16,
+        receive_timeout=DEFAULT_RECEIVE_TIMEOUT,
+        shard=False,
+        limiter=None,
+    ):
         """
-        :param session: http session
+        :param session: http session, see create_session. It is not closed by the client.
         :type session: aiohttp.ClientSession
         :param out_path: output path
         :type out_path: str
         :param group_album: should images be grouped in folders per album
         :type group_album: bool
+        :param sink: sink running the file operations off the event loop
+        :type sink: FileSink
+        :param max_pending_images: maximum number of received images waiting to be written
+        :type max_pending_images: int
+        :param receive_timeout: seconds waiting for the next image before giving up on the
+            images still missing
+        :type receive_timeout: float
+        :param shard: spread images in directories named after the hash of their name
+        :type shard: bool
+        :param limiter: limits of the request and download rates, shared with other clients
+        :type limiter: RateLimiter
         """
+        self._own_session = session is None
         if session:
             self.session = session
         else:
-            self.session = aiohttp.ClientSession()
+            self.session = create_session()
         self.out_path = out_path
         self.group_album = group_album
         self.token = None
+        self.max_pending_images = max_pending_images
+        self.receive_timeout = receive_timeout
+        self.shard = shard
+        self._own_sink = sink is None
+        self.sink = sink if sink else FileSink()
+        self.limiter = limiter if limiter else RateLimiter()
 
     async def __aenter__(self):
         self._did_enter_with = True
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session and self._did_enter_with:
+        if self.session and self._own_session and self._did_enter_with:
             await self.session.close()
+        if self._own_sink:
+            self.sink.close()
 
-    async def download_album(self, album_id):
+    async def download_album(self, album_id, dry_run=False):
+        """
+        Download an album from old unsee
+        :param album_id: album id
+        :type album_id: str
+        :param dry_run: only list the album images
+        :type dry_run: bool
+        """
         unsee_name = names.get_random()
         ws_params = "?album={}&name={}".format(album_id, unsee_name)
-        ssl_context = ssl.create_default_context()
+        ssl_context = get_ssl_context()
 
         # Settings WS
+        await self.limiter.request()
         async with self.session.ws_connect(
             _UNSEE_WEBSOCKET_URL.format("settings") + ws_params, ssl=ssl_context
         ) as ws_settings:
@@ -120,6 +219,7 @@ class ClientOld:
         images_info = []
 
         # PubSub WS
+        await self.limiter.request()
         async with self.session.ws_connect(
             _UNSEE_WEBSOCKET_URL.format("pubsub") + ws_params, ssl=ssl_context
         ) as ws_pubsub:
@@ -148,38 +248,68 @@ class ClientOld:
         else:
             print("Found album {} with {} images.".format(album_id, len(images_info)))
 
-        if len(images_info) <= 0:
+        if len(images_info) <= 0 or dry_run:
             return
 
+        # Images are hashed and written in the sink threads while the socket keeps
+        # receiving, with at most max_pending_images blobs held in memory
+        pending = set()
+        slots = asyncio.Semaphore(self.max_pending_images)
+
+        async def save(image_data):
+            # noinspection PyBroadException
+            try:
+                image = UnseeImage(
+                    album_id,
+                    out_path=self.out_path,
+                    group_album=self.group_album,
+                    shard=self.shard,
+                )
+                image_path = await self.sink.run(image.write_file_from_blob, image_data)
+                logging.debug("Wrote image {}".format(image_path))
+            except:
+                logging.warning("Failed writing image from album {}".format(album_id))
+            finally:
+                slots.release()
+
         # Imgpush WS
+        await self.limiter.request()
         async with self.session.ws_connect(
             _UNSEE_WEBSOCKET_URL.format("imgpush") + ws_params, ssl=ssl_context
         ) as ws_imgpush:
+            # The socket is closed as soon as the last image arrives
+            tracker = ImageTracker(len(images_info))
+            missing_reason = None
             data: WSMessage
-            async for data in ws_imgpush:
-                logging.debug(
-                    "[ws_imgpush] received image (len: {})".format(len(data.data))
-                )
-
-                # noinspection PyBroadException
+            while not tracker.done:
                 try:
-                    image = UnseeImage(
-                        album_id, out_path=self.out_path, group_album=self.group_album
-                    )
-                    image_path = image.write_file_from_blob(data.data)
-                    logging.debug("Wrote image {}".format(image_path))
+                    data = await ws_imgpush.receive(timeout=self.receive_timeout)
+                except asyncio.TimeoutError:
+                    missing_reason = "Timed out waiting for {} images of album {}"
+                    break
 
-                    image_info = next(
-                        filter(lambda info: info["id"] == image.image_id, images_info),
-                        None,
-                    )
-                    if image_info is not None:
-                        images_info.remove(image_info)
-                except:
-                    logging.warning(
-                        "Failed writing image from album {}".format(album_id)
+                if data.type == aiohttp.WSMsgType.BINARY:
+                    logging.debug(
+                        "[ws_imgpush] received image (len: {})".format(len(data.data))
                     )
+                    tracker.mark()
+                    await self.limiter.receive(len(data.data))
+
+                    await slots.acquire()
+                    task = asyncio.ensure_future(save(data.data))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+                elif data.type == aiohttp.WSMsgType.TEXT:
+                    logging.debug("[ws_imgpush] Ignoring message: {}".format(data.data))
+                else:
+                    missing_reason = "Socket closed with {} images of album {} missing"
+                    break
+
+            await ws_imgpush.close()
 
-                if len(images_info) <= 0:
-                    await ws_imgpush.close()
+        if pending:
+            await asyncio.gather(*pending)
 
+        # The images received are kept, the album is failed to be downloaded again
+        if not tracker.done:
+            raise Exception(missing_reason.format(tracker.missing, album_id))